@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Prmission SDK lifecycle benchmark
+
+Deploys MockUSDC + PrmissionV2 to a local Hardhat or anvil node and drives
+full escrow lifecycles (grant -> deposit -> report -> settle) through
+PrmissionSDK, one worker account per concurrent lane. Reports latency
+percentiles, tx/s and JSON-RPC calls per SDK method as JSON.
+
+    npx hardhat compile && npx hardhat node
+    python benchmarks/bench_lifecycle.py --lifecycles 200 --concurrency 8 --out bench.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from eth_account import Account
+from web3 import Web3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import prmission_sdk
+from prmission_sdk import PrmissionSDK, MetricsRegistry, engine
+from prmission_sdk.constants import DISPUTE_WINDOW
+
+HARDHAT_MNEMONIC = "test test test test test test test test test test test junk"
+ARTIFACTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "artifacts", "contracts")
+METHODS = ["grant_permission", "deposit_escrow", "report_outcome", "settle"]
+
+
+def load_artifact(artifacts, name):
+    with open(os.path.join(artifacts, f"{name}.sol", f"{name}.json")) as f:
+        artifact = json.load(f)
+    return artifact["abi"], artifact["bytecode"]
+
+
+def deploy(w3, deployer, artifacts, name, *args):
+    abi, bytecode = load_artifact(artifacts, name)
+    tx = w3.eth.contract(abi=abi, bytecode=bytecode).constructor(*args).build_transaction({"from": deployer.address, "nonce": w3.eth.get_transaction_count(deployer.address)})
+    tx_hash = w3.eth.send_raw_transaction(deployer.sign_transaction(tx).raw_transaction)
+    return w3.eth.wait_for_transaction_receipt(tx_hash)["contractAddress"], abi
+
+
+def rpc_counts(metrics):
+    """JSON-RPC requests per method so far, as recorded by the SDK's metrics middleware."""
+    return Counter({c["labels"]["method"]: c["value"] for c in metrics.snapshot()["counters"] if c["name"] == "rpc_requests_total"})
+
+
+def tx_breakdown(registries):
+    """Mean seconds per submit/confirm phase and gas used / estimated, per contract function, across lanes."""
+    merged = defaultdict(lambda: [0, 0.0, 0.0])
+    for metrics in registries:
+        for obs in metrics.snapshot()["observations"]:
+            if obs["name"] in ("tx_phase_seconds", "tx_gas_used_ratio"):
+                key = (obs["labels"]["fn"], obs["labels"].get("phase", "gas_used_ratio"))
+                merged[key][0] += obs["count"]
+                merged[key][1] += obs["sum"]
+                merged[key][2] = max(merged[key][2], obs["max"])
+    out = defaultdict(dict)
+    for (fn, phase), (count, total, top) in sorted(merged.items()):
+        if phase == "gas_used_ratio":
+            out[fn]["gas_used_ratio_mean"] = total / count
+            out[fn]["gas_used_ratio_max"] = top
+        else:
+            out[fn][f"{phase}_ms"] = total / count * 1000
+    return dict(out)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.rpc = defaultdict(Counter)
+        self.wall = {}
+
+    def record(self, method, seconds, rpc_delta):
+        with self.lock:
+            self.latencies[method].append(seconds)
+            self.rpc[method].update(rpc_delta)
+
+    def summary(self):
+        out = {}
+        for method in METHODS:
+            lat = self.latencies.get(method)
+            if not lat:
+                continue
+            n = len(lat)
+            out[method] = {
+                "count": n,
+                "mean_ms": statistics.fmean(lat) * 1000,
+                "p50_ms": percentile(lat, 50) * 1000,
+                "p90_ms": percentile(lat, 90) * 1000,
+                "p99_ms": percentile(lat, 99) * 1000,
+                "max_ms": max(lat) * 1000,
+                "tx_per_s": n / self.wall[method] if self.wall.get(method) else None,
+                "rpc_calls_per_op": sum(self.rpc[method].values()) / n,
+                "rpc_methods_per_op": {m: c / n for m, c in sorted(self.rpc[method].items())},
+            }
+        return out
+
+
+class Lane:
+    """One worker account with its own SDK and provider, so RPC counts per op are exact."""
+
+    def __init__(self, key, env, args):
+        self.metrics = MetricsRegistry()
+        self.sdk = PrmissionSDK(
+            key, rpc_url=args.rpc, contract_address=env["prmission"], usdc_address=env["usdc"],
+            chain_id=env["chain_id"], multicall_address=None, metrics=self.metrics,
+        )
+        self.pipeline = args.pipeline
+        self.permissions, self.escrows = [], []
+
+    def run(self, recorder, method, calls):
+        """calls: list of (fn, args, kwargs) for this lane. Returns results in order."""
+        if not self.pipeline:
+            results = []
+            for fn, a, kw in calls:
+                before = rpc_counts(self.metrics)
+                start = time.perf_counter()
+                results.append(fn(*a, **kw))
+                recorder.record(method, time.perf_counter() - start, rpc_counts(self.metrics) - before)
+            return results
+        # Pipelined: submit everything, then wait; latency is submit -> confirmed
+        before = rpc_counts(self.metrics)
+        submitted = []
+        for fn, a, kw in calls:
+            submitted.append((time.perf_counter(), fn(*a, wait=False, **kw)))
+        results = []
+        for i, (start, pending) in enumerate(submitted):
+            results.append(pending.result())
+            delta = rpc_counts(self.metrics) - before if i == len(submitted) - 1 else Counter()
+            recorder.record(method, time.perf_counter() - start, delta)
+        return results
+
+
+def setup(args):
+    Account.enable_unaudited_hdwallet_features()
+    keys = [Account.from_mnemonic(HARDHAT_MNEMONIC, account_path=f"m/44'/60'/0'/0/{i}") for i in range(args.concurrency + 1)]
+    w3 = Web3(Web3.HTTPProvider(args.rpc))
+    if not w3.is_connected():
+        raise ConnectionError(f"Cannot connect to {args.rpc} (start `npx hardhat node` or `anvil`)")
+    deployer = keys[0]
+    usdc, usdc_abi = deploy(w3, deployer, args.artifacts, "MockUSDC")
+    prmission, _ = deploy(w3, deployer, args.artifacts, "PrmissionV2", usdc, deployer.address)
+    token = w3.eth.contract(address=usdc, abi=usdc_abi)
+    nonce = w3.eth.get_transaction_count(deployer.address)
+    for i, lane in enumerate(keys[1:]):
+        tx = token.functions.mint(lane.address, 10**15).build_transaction({"from": deployer.address, "nonce": nonce + i})
+        w3.eth.send_raw_transaction(deployer.sign_transaction(tx).raw_transaction)
+    w3.eth.wait_for_transaction_receipt(w3.eth.send_raw_transaction(deployer.sign_transaction(
+        {"to": deployer.address, "value": 0, "gas": 21000, "gasPrice": w3.eth.gas_price, "nonce": nonce + len(keys) - 1, "chainId": w3.eth.chain_id}
+    ).raw_transaction))
+    return w3, {"prmission": prmission, "usdc": usdc, "chain_id": w3.eth.chain_id}, [k.key.hex() for k in keys[1:]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rpc", default="http://127.0.0.1:8545")
+    parser.add_argument("--artifacts", default=os.path.normpath(ARTIFACTS), help="Hardhat artifacts/contracts directory")
+    parser.add_argument("--lifecycles", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pipeline", action="store_true", help="submit with wait=False and collect receipts afterwards")
+    parser.add_argument("--amount", type=int, default=1_000_000)
+    parser.add_argument("--out", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    result = run(args)
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+def run(args):
+    w3, env, keys = setup(args)
+    lanes = [Lane(key, env, args) for key in keys]
+    for i in range(args.lifecycles):
+        lanes[i % len(lanes)].permissions.append(None)
+    recorder = Recorder()
+    pool = ThreadPoolExecutor(max_workers=len(lanes))
+
+    def phase(method, build):
+        start = time.perf_counter()
+        list(pool.map(build, lanes))
+        recorder.wall[method] = time.perf_counter() - start
+
+    def grant(lane):
+        lane.permissions = lane.run(recorder, "grant_permission", [(lane.sdk.grant_permission, ("bench_data", "bench_purpose", 1000, 7 * 86400), {}) for _ in lane.permissions])
+
+    def deposit(lane):
+        # Approve up front so the first deposit's latency is comparable to the rest
+        lane.sdk.ensure_allowance(args.amount * len(lane.permissions))
+        lane.escrows = lane.run(recorder, "deposit_escrow", [(lane.sdk.deposit_escrow, (p, args.amount), {}) for p in lane.permissions])
+
+    def report(lane):
+        lane.run(recorder, "report_outcome", [(lane.sdk.report_outcome, (e, args.amount, "bench", "benchmark lifecycle"), {}) for e in lane.escrows])
+
+    def settle(lane):
+        lane.run(recorder, "settle", [(lane.sdk.settle, (e,), {}) for e in lane.escrows])
+
+    phase("grant_permission", grant)
+    phase("deposit_escrow", deposit)
+    phase("report_outcome", report)
+
+    # The offline engine must agree with the deployed contract
+    offline = engine.preview_settlement(args.amount, 1000)
+    mismatches = 0
+    for lane in lanes:
+        for preview in lane.sdk.preview_settlements(lane.escrows):
+            mismatches += any(preview[k] != offline[k] for k in preview)
+
+    w3.provider.make_request("evm_increaseTime", [DISPUTE_WINDOW + 1])
+    w3.provider.make_request("evm_mine", [])
+    phase("settle", settle)
+
+    return {
+        "sdk_version": prmission_sdk.__version__,
+        "timestamp": int(time.time()),
+        "config": {"rpc": args.rpc, "lifecycles": args.lifecycles, "concurrency": args.concurrency, "pipeline": args.pipeline, "amount": args.amount},
+        "methods": recorder.summary(),
+        "tx_phases": tx_breakdown(lane.metrics for lane in lanes),
+        "engine_mismatches": mismatches,
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Prmission SDK RPC pool benchmark
+
+Starts several stand-in JSON-RPC endpoints in front of one local node, each
+adding its own latency, slow-response tail and failure rate, then drives
+eth_call load through a single endpoint and through RPCPool over all of
+them. Reports latency percentiles, errors, hedges and ejections as JSON;
+--sends also broadcasts transfers through the pool and waits for them.
+
+    npx hardhat node
+    python benchmarks/bench_rpc_pool.py --reads 2000 --concurrency 8 --sends 20
+
+Each --node is delay_ms:slow_rate:slow_ms:fail_rate, e.g. 5:0.1:800:0 is a
+5 ms endpoint that stalls 800 ms on 10% of requests.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_account import Account
+from web3 import Web3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import prmission_sdk
+from prmission_sdk import MetricsRegistry, RPCPool
+from prmission_sdk.rpc import ChainIdCacheMiddleware
+
+HARDHAT_MNEMONIC = "test test test test test test test test test test test junk"
+DEFAULT_NODES = ["5:0.1:800:0", "5:0:0:0.3", "40:0:0:0"]
+
+
+class StandInNode:
+    """Local JSON-RPC proxy to `upstream` that injects delays and HTTP 503s."""
+
+    def __init__(self, upstream, delay=0.0, slow_rate=0.0, slow_delay=0.0, fail_rate=0.0):
+        self.upstream = upstream
+        self.delay = delay
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.fail_rate = fail_rate
+        self.requests = 0
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                node.requests += 1
+                time.sleep(node.delay + (node.slow_delay if random.random() < node.slow_rate else 0))
+                if random.random() < node.fail_rate:
+                    self.send_error(503)
+                    return
+                request = urllib.request.Request(node.upstream, body, {"Content-Type": "application/json"})
+                with urllib.request.urlopen(request) as response:
+                    payload = response.read()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def from_spec(cls, upstream, spec):
+        delay_ms, slow_rate, slow_ms, fail_rate = (float(v) for v in spec.split(":"))
+        return cls(upstream, delay_ms / 1000, slow_rate, slow_ms / 1000, fail_rate)
+
+    def close(self):
+        self.server.shutdown()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def drive_reads(w3, reads, concurrency):
+    call = {"to": "0x0000000000000000000000000000000000000000", "data": "0x"}
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            w3.eth.call(call)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(reads)))
+    wall = time.perf_counter() - start
+    ms = [v * 1000 for v in latencies] or [0.0]
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "calls_per_s": len(latencies) / wall,
+        "p50_ms": percentile(ms, 50),
+        "p90_ms": percentile(ms, 90),
+        "p99_ms": percentile(ms, 99),
+        "max_ms": max(ms),
+    }
+
+
+def drive_sends(w3, account, count):
+    """Broadcast `count` 1-wei self transfers through the pool; all must be mined."""
+    nonce = w3.eth.get_transaction_count(account.address, "pending")
+    fees = {"maxFeePerGas": w3.eth.gas_price * 2, "maxPriorityFeePerGas": 1}
+    hashes = []
+    start = time.perf_counter()
+    for i in range(count):
+        tx = {"from": account.address, "to": account.address, "value": 1, "gas": 21000, "nonce": nonce + i, "chainId": w3.eth.chain_id, **fees}
+        hashes.append(w3.eth.send_raw_transaction(account.sign_transaction(tx).raw_transaction))
+    receipts = [w3.eth.wait_for_transaction_receipt(h, timeout=60, poll_latency=0.1) for h in hashes]
+    return {"sent": count, "confirmed": sum(r["status"] == 1 for r in receipts), "seconds": time.perf_counter() - start}
+
+
+def counter_total(metrics, name):
+    return sum(c["value"] for c in metrics.snapshot()["counters"] if c["name"] == name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--upstream", default="http://127.0.0.1:8545")
+    parser.add_argument("--node", action="append", help="stand-in endpoint delay_ms:slow_rate:slow_ms:fail_rate (repeatable)")
+    parser.add_argument("--reads", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--hedge-after", type=float, default=0.1)
+    parser.add_argument("--sends", type=int, default=0, help="transfers to broadcast through the pool")
+    parser.add_argument("--out", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    specs = args.node or DEFAULT_NODES
+    nodes = [StandInNode.from_spec(args.upstream, spec) for spec in specs]
+    try:
+        single = Web3(Web3.HTTPProvider(nodes[0].url))
+        metrics = MetricsRegistry()
+        pooled = Web3(RPCPool([n.url for n in nodes], hedge_after=args.hedge_after, metrics=metrics))
+        # As in the SDK, so every eth_call is one request
+        for w3 in (single, pooled):
+            w3.middleware_onion.add(ChainIdCacheMiddleware.build({}), "chain_id_cache")
+        result = {
+            "sdk_version": prmission_sdk.__version__,
+            "timestamp": int(time.time()),
+            "config": {"upstream": args.upstream, "nodes": specs, "reads": args.reads, "concurrency": args.concurrency, "hedge_after": args.hedge_after},
+            "single": drive_reads(single, args.reads, args.concurrency),
+            "pool": drive_reads(pooled, args.reads, args.concurrency),
+        }
+        result["pool"].update({
+            "hedges": counter_total(metrics, "rpc_hedges_total"),
+            "hedge_wins": counter_total(metrics, "rpc_hedge_wins_total"),
+            "ejections": counter_total(metrics, "rpc_endpoint_ejections_total"),
+            "endpoints": pooled.provider.stats(),
+        })
+        if args.sends:
+            Account.enable_unaudited_hdwallet_features()
+            account = Account.from_mnemonic(HARDHAT_MNEMONIC, account_path="m/44'/60'/0'/0/0")
+            result["sends"] = drive_sends(pooled, account, args.sends)
+        result["node_requests"] = [n.requests for n in nodes]
+    finally:
+        for node in nodes:
+            node.close()
+
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
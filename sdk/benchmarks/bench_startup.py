@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Prmission SDK cold-start benchmark
+
+Runs each scenario in a fresh interpreter and reports median milliseconds
+for importing the package, constructing PrmissionSDK and making the first
+RPC call, as JSON. Point --sdk-path at another checkout (e.g. a git
+worktree of the previous release) to compare.
+
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --rpc http://127.0.0.1:8545 --contract 0x... --usdc 0x...
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SDK_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DUMMY_KEY = "0x" + "11" * 32
+
+PROBE = r"""
+import inspect, json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {sdk_path!r})
+timings = {{}}
+# Only API every release has, so --sdk-path can point at an old checkout
+import prmission_sdk.constants
+timings["import_offline_ms"] = (time.perf_counter() - start) * 1000
+timings["web3_loaded_by_import"] = "web3" in sys.modules
+if {stage} >= 1:
+    from prmission_sdk import PrmissionSDK
+    timings["import_client_ms"] = (time.perf_counter() - start) * 1000
+if {stage} >= 2:
+    t = time.perf_counter()
+    kwargs = {{k: v for k, v in (("contract_address", {contract!r}), ("usdc_address", {usdc!r})) if v}}
+    # Local nodes have no Multicall3; releases without the option read one call at a time anyway
+    if "multicall_address" in inspect.signature(PrmissionSDK).parameters:
+        kwargs["multicall_address"] = None
+    try:
+        sdk = PrmissionSDK({key!r}, rpc_url={rpc!r}, **kwargs)
+    except ConnectionError:
+        # Older releases call is_connected() while constructing; only fatal when measuring calls
+        if {stage} >= 3:
+            raise
+        sdk = None
+    timings["construct_ms"] = (time.perf_counter() - t) * 1000
+if {stage} >= 3:
+    t = time.perf_counter()
+    if {contract!r}:
+        sdk.get_protocol_stats()
+    else:
+        sdk.w3.eth.block_number
+    timings["first_call_ms"] = (time.perf_counter() - t) * 1000
+    timings["time_to_first_call_ms"] = (time.perf_counter() - start) * 1000
+print(json.dumps(timings))
+"""
+
+
+def probe(args, stage):
+    code = PROBE.format(sdk_path=args.sdk_path, stage=stage, key=DUMMY_KEY, rpc=args.rpc or "http://127.0.0.1:8545", contract=args.contract, usdc=args.usdc)
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    timings = json.loads(out.strip().splitlines()[-1])
+    timings["process_ms"] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+def median_of(runs):
+    keys = runs[0].keys()
+    return {k: statistics.median(r[k] for r in runs) if isinstance(runs[0][k], float) else runs[0][k] for k in keys}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--sdk-path", default=SDK_PATH, help="directory containing the prmission_sdk package to measure")
+    parser.add_argument("--rpc", help="measure time to first call against this endpoint")
+    parser.add_argument("--contract", help="PrmissionV2 address on --rpc; first call is get_protocol_stats() instead of eth_blockNumber")
+    parser.add_argument("--usdc")
+    parser.add_argument("--out", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    scenarios = {"import_offline": 0, "import_client": 1, "construct": 2}
+    if args.rpc:
+        scenarios["first_call"] = 3
+    result = {
+        "python": sys.version.split()[0],
+        "sdk_path": os.path.abspath(args.sdk_path),
+        "timestamp": int(time.time()),
+        "runs": args.runs,
+        "scenarios": {name: median_of([probe(args, stage) for _ in range(args.runs)]) for name, stage in scenarios.items()},
+    }
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@
 Prmission Demo AI Agent
 An AI agent that pays users for data access on Base mainnet.
 """
+import logging
 import os
 import sys
 from dotenv import load_dotenv
@@ -11,6 +12,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from prmission_sdk import PrmissionSDK
 
 load_dotenv('/Users/marcosbenaim/prmission-sdk/.env', override=True)
+logging.basicConfig(level=logging.INFO, format="  %(message)s")
 
 def main():
     print("")
@@ -114,6 +116,7 @@ def main():
 
     print(f"\n  To settle after 24 hours, run:")
     print(f"  sdk.settle({escrow_id})")
+    print(f"  or leave it to SettlementSweeper(sdk).run()")
 
     # Final summary
     print("\n" + "=" * 55)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Prmission Fee Report
+Exports settlement history from Base mainnet to compressed CSV chunks,
+then totals protocol fees and user payouts by data category, merchant and day.
+Re-running only fetches blocks added since the last export.
+"""
+import argparse
+import csv
+import glob
+import gzip
+import logging
+import os
+import sys
+from collections import defaultdict
+from dotenv import load_dotenv
+from web3 import Web3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from prmission_sdk import EventExporter
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO, format="  %(message)s")
+
+
+def settlements(out_dir):
+    for path in sorted(glob.glob(os.path.join(out_dir, "settlements-*.csv.gz"))):
+        with gzip.open(path, "rt", newline="") as f:
+            yield from csv.DictReader(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Prmission settlements and total fees")
+    parser.add_argument("--out", default="prmission_export")
+    parser.add_argument("--start-block", type=int, default=0, help="deployment block of the contract")
+    parser.add_argument("--by", choices=["data_category", "merchant", "date"], nargs="+", default=["data_category", "date"])
+    args = parser.parse_args()
+
+    w3 = Web3(Web3.HTTPProvider(os.getenv("RPC_URL", "https://mainnet.base.org")))
+    exporter = EventExporter(w3, args.out, start_block=args.start_block)
+    print(f"\nExporting to {args.out}/ ...")
+    print(f"  New rows: {exporter.export()}")
+    exporter.close()
+
+    totals = defaultdict(lambda: [0, 0, 0])
+    for row in settlements(args.out):
+        total = totals[tuple(row[k] or "-" for k in args.by)]
+        total[0] += 1
+        total[1] += int(row["protocol_fee"])
+        total[2] += int(row["user_share"])
+
+    print(f"\n{' / '.join(args.by)}: settlements, protocol fee USDC, user share USDC")
+    for key, (count, fee, share) in sorted(totals.items()):
+        print(f"  {' / '.join(key)}: {count}, {fee / 10**6:.2f}, {share / 10**6:.2f}")
+
+
+if __name__ == "__main__":
+    main()
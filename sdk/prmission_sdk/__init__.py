@@ -1,7 +1,8 @@
 """
 Prmission Protocol SDK
 """
-from .client import PrmissionSDK
+import importlib
+import logging
 from .constants import (
     PRMISSION_V2_ADDRESS,
     USDC_BASE_ADDRESS,
@@ -9,5 +10,38 @@ from .constants import (
     BASE_CHAIN_ID,
 )
 
+# Silent unless the application configures logging; transaction progress is logged at INFO
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
 __version__ = "0.1.0"
-__all__ = ["PrmissionSDK", "PRMISSION_V2_ADDRESS", "USDC_BASE_ADDRESS", "BASE_MAINNET_RPC"]
+__all__ = ["PrmissionSDK", "PendingTx", "AsyncPrmissionSDK", "AsyncPendingTx", "NonceManager", "FeeOracle", "AsyncFeeOracle", "GasEstimateCache", "MetricsRegistry", "RPCMetricsMiddleware", "RPCPool", "AsyncRPCPool", "serve_prometheus", "StateCache", "TTLCache", "EventIndexer", "EventExporter", "SettlementSweeper", "engine", "PRMISSION_V2_ADDRESS", "USDC_BASE_ADDRESS", "BASE_MAINNET_RPC"]
+
+# Submodules are imported on first attribute access, so the constants and
+# web3-free helpers (engine, cache, metrics) load without pulling in web3
+_LAZY = {
+    "PrmissionSDK": ".client", "PendingTx": ".client",
+    "AsyncPrmissionSDK": ".async_client", "AsyncPendingTx": ".async_client",
+    "StateCache": ".cache", "TTLCache": ".cache",
+    "EventIndexer": ".indexer",
+    "EventExporter": ".export",
+    "NonceManager": ".nonce",
+    "FeeOracle": ".fees", "AsyncFeeOracle": ".fees", "GasEstimateCache": ".fees",
+    "MetricsRegistry": ".metrics", "serve_prometheus": ".metrics",
+    "RPCMetricsMiddleware": ".rpc",
+    "RPCPool": ".pool", "AsyncRPCPool": ".pool",
+    "SettlementSweeper": ".settlement",
+}
+
+
+def __getattr__(name):
+    if name == "engine":
+        return importlib.import_module(".engine", __name__)
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,393 @@
+import asyncio
+import logging
+from functools import cached_property
+import aiohttp
+from web3 import Web3
+from web3.exceptions import TimeExhausted, TransactionNotFound
+from web3.providers.async_base import AsyncJSONBaseProvider
+from .constants import (
+    PRMISSION_V2_ADDRESS, USDC_BASE_ADDRESS, BASE_MAINNET_RPC, BASE_CHAIN_ID,
+    MULTICALL3_ADDRESS, READ_BATCH_SIZE,
+)
+from .decode import (
+    usdc_to_raw, raw_to_usdc, decode_permission, decode_escrow, decode_access,
+    decode_settlement, decode_protocol_stats, chunked,
+)
+from .multicall import encode_aggregate3, decode_aggregate3
+from .cache import StateCache, MISSING, cached_lookup, store_fetched
+from .nonce import NonceManager
+from .fees import AsyncFeeOracle, GasEstimateCache
+from .rpc import make_w3
+from .metrics import DEFAULT_REGISTRY, instrumented
+from .contracts import shared_connection
+from .tx import ALREADY_KNOWN, RESYNC, UNCONFIRMED, BasePendingTx, record_sent, send_error_action
+
+logger = logging.getLogger(__name__)
+
+_sessions = {}
+
+
+def shared_session(pool_size=100):
+    """One pooled aiohttp session per event loop, shared by every AsyncPrmissionSDK on that loop."""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=pool_size))
+        _sessions[loop] = session
+    return session
+
+
+async def close_shared_session():
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+class AsyncPendingTx(BasePendingTx):
+    """Handle for a broadcast transaction. Await result() to wait until it is mined."""
+
+    async def _late_receipt(self, timeout_error):
+        # Mined just after the timeout, replaced by another transaction, or still pending
+        try:
+            return await self.sdk.w3.eth.get_transaction_receipt(self.tx_hash)
+        except TransactionNotFound:
+            pass
+        if self._replaced(await self.sdk.w3.eth.get_transaction_count(self.sdk.address)):
+            raise Exception(f"Transaction replaced: {self.tx_hash.hex()}") from timeout_error
+        raise timeout_error
+
+    async def receipt(self, timeout=120):
+        if self._receipt is not None:
+            return self._receipt
+        metrics = self.sdk.metrics
+        try:
+            with metrics.timer("tx_phase_seconds", phase="receipt_wait", fn=self.fn_name):
+                receipt = await self.sdk.w3.eth.wait_for_transaction_receipt(self.tx_hash, timeout=timeout, poll_latency=self.sdk.poll_latency)
+        except TimeExhausted as e:
+            metrics.inc("tx_timeouts_total", fn=self.fn_name)
+            receipt = await self._late_receipt(e)
+        return self._accept(receipt)
+
+    async def result(self, timeout=120):
+        result = {"tx_hash": self.tx_hash.hex(), "receipt": await self.receipt(timeout)}
+        if self._decode is None:
+            return result
+        with self.sdk.metrics.timer("tx_phase_seconds", phase="decode", fn=self.fn_name):
+            return await self._decode(result)
+
+
+class AsyncPrmissionSDK:
+    """
+    asyncio twin of PrmissionSDK on AsyncWeb3. Every method has the same name,
+    arguments and return value as the sync client, but is a coroutine.
+    Use as `async with AsyncPrmissionSDK(...) as sdk:` or call connect() first.
+    """
+
+    def __init__(self, private_key, rpc_url=BASE_MAINNET_RPC, contract_address=PRMISSION_V2_ADDRESS, usdc_address=USDC_BASE_ADDRESS, gas_multiplier=1.2, nonce_retries=2, chain_id=BASE_CHAIN_ID, multicall_address=MULTICALL3_ADDRESS, read_batch_size=READ_BATCH_SIZE, cache_size=10_000, cache_ttl=5.0, pool_size=100, poll_latency=0.5, metrics=None, fee_max_age=2.0, gas_cache_ttl=300.0):
+        self.rpc_url = rpc_url
+        self.metrics = metrics if metrics is not None else DEFAULT_REGISTRY
+        endpoint = tuple(rpc_url) if isinstance(rpc_url, list) else rpc_url
+        self.connection = shared_connection(("async", endpoint, id(self.metrics)), lambda: make_w3(rpc_url, self.metrics, asynchronous=True))
+        self.w3 = self.connection.w3
+        self.account = self.w3.eth.account.from_key(private_key)
+        self.address = self.account.address
+        self.gas_multiplier = gas_multiplier
+        self.nonce_retries = nonce_retries
+        self.chain_id = chain_id
+        self.pool_size = pool_size
+        self.poll_latency = poll_latency
+        self.nonces = NonceManager()
+        self.fees = AsyncFeeOracle(self.w3, max_age=fee_max_age)
+        self.gas_estimates = GasEstimateCache(gas_cache_ttl)
+        self._nonce_lock = asyncio.Lock()
+        self.contract_address = contract_address
+        self.usdc_address = usdc_address
+        self.multicall_address = multicall_address
+        self.read_batch_size = read_batch_size
+        self.cache = StateCache(cache_size, cache_ttl)
+
+    # ─── Contracts (built on first use, shared per endpoint) ────────────
+
+    @cached_property
+    def contract(self):
+        return self.connection.contract("prmission", self.contract_address)
+
+    @cached_property
+    def usdc(self):
+        return self.connection.contract("erc20", self.usdc_address)
+
+    @cached_property
+    def multicall(self):
+        return self.connection.contract("multicall3", self.multicall_address) if self.multicall_address else None
+
+    async def connect(self):
+        if hasattr(self.w3.provider, "cache_async_session"):
+            await self.w3.provider.cache_async_session(shared_session(self.pool_size))
+        if not await self.w3.is_connected():
+            raise ConnectionError(f"Cannot connect to {self.rpc_url}")
+        logger.info("SDK initialized | Address: %s | Base Mainnet", self.address)
+        return self
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc):
+        # The pooled session outlives any one client; see close_shared_session()
+        pass
+
+    async def _chain_nonce(self):
+        return await self.w3.eth.get_transaction_count(self.address, "pending")
+
+    async def _next_nonce(self):
+        # Only one coroutine may fetch the chain nonce, or two could be handed the same value
+        async with self._nonce_lock:
+            if self.nonces.needs_sync:
+                self.nonces.resync(await self._chain_nonce())
+            return self.nonces.next()
+
+    async def _find_sent(self, signed, nonce):
+        # The send failed without a verdict from the node; it may still have gone through
+        try:
+            await self.w3.eth.get_transaction(signed.hash)
+            return ALREADY_KNOWN
+        except TransactionNotFound:
+            self.nonces.release(nonce)
+        except Exception:
+            # Can't tell: take the nonce from the chain again on the next send
+            self.nonces.reset()
+        return None
+
+    async def submit_tx(self, tx_func, description="", decode=None):
+        fn_name = tx_func.fn_name
+        timer = self.metrics.timer
+        with timer("tx_phase_seconds", phase="fees", fn=fn_name):
+            fees = await self.fees.suggest()
+        with timer("tx_phase_seconds", phase="build", fn=fn_name):
+            tx = await tx_func.build_transaction({"from": self.address, "chainId": self.chain_id, "gas": 0, **fees})
+        gas_profile = self.gas_estimates.profile(tx_func)
+        gas_estimate = self.gas_estimates.get(gas_profile)
+        if gas_estimate is MISSING:
+            with timer("tx_phase_seconds", phase="estimate_gas", fn=fn_name):
+                gas_estimate = await self.w3.eth.estimate_gas(tx)
+            self.gas_estimates.store(gas_profile, gas_estimate)
+        tx["gas"] = int(gas_estimate * self.gas_multiplier)
+        for attempt in range(self.nonce_retries + 1):
+            with timer("tx_phase_seconds", phase="nonce", fn=fn_name):
+                tx["nonce"] = await self._next_nonce()
+            with timer("tx_phase_seconds", phase="sign", fn=fn_name):
+                signed = self.account.sign_transaction(tx)
+            try:
+                with timer("tx_phase_seconds", phase="send", fn=fn_name):
+                    tx_hash = await self.w3.eth.send_raw_transaction(signed.raw_transaction)
+                break
+            except Exception as e:
+                action = send_error_action(self, e, tx["nonce"], fn_name, attempt < self.nonce_retries)
+                if action == UNCONFIRMED:
+                    action = await self._find_sent(signed, tx["nonce"])
+                if action == ALREADY_KNOWN:
+                    tx_hash = signed.hash
+                    break
+                if action == RESYNC:
+                    # Nonce too low: continue from the chain's
+                    async with self._nonce_lock:
+                        self.nonces.resync(await self._chain_nonce())
+                    if attempt < self.nonce_retries:
+                        continue
+                raise
+        record_sent(self, tx_func, tx, tx_hash, description, gas_estimate)
+        return AsyncPendingTx(self, tx_hash, tx["nonce"], description, decode, tx_func, gas_estimate, gas_profile)
+
+    async def _send_tx(self, tx_func, description="", wait=True, decode=None):
+        pending = await self.submit_tx(tx_func, description, decode)
+        if not wait:
+            return pending
+        return await pending.result()
+
+    async def wait_all(self, pending_txs, timeout=120):
+        return await asyncio.gather(*(p.result(timeout) for p in pending_txs))
+
+    def usdc_to_raw(self, amount):
+        return usdc_to_raw(amount)
+
+    def raw_to_usdc(self, raw):
+        return raw_to_usdc(raw)
+
+    @instrumented
+    async def usdc_balance(self):
+        return await self.usdc.functions.balanceOf(self.address).call()
+
+    @instrumented
+    async def usdc_allowance(self):
+        amount = self.cache.get_allowance(self.address)
+        if amount is MISSING:
+            amount = await self.usdc.functions.allowance(self.address, self.contract.address).call()
+            self.cache.store_allowance(self.address, amount)
+        return amount
+
+    @instrumented
+    async def approve_usdc(self, amount, wait=True):
+        return await self._send_tx(self.usdc.functions.approve(self.contract.address, amount), f"Approve {self.raw_to_usdc(amount)} USDC", wait=wait)
+
+    @instrumented
+    async def ensure_allowance(self, amount):
+        current = await self.usdc_allowance()
+        if current < amount:
+            logger.info("Approving USDC...")
+            await self.approve_usdc(2**256 - 1)
+
+    @instrumented
+    async def grant_permission(self, data_category, purpose, compensation_bps, validity_period, merchant="0x0000000000000000000000000000000000000000", upfront_fee=0, wait=True):
+        return await self._send_tx(
+            self.contract.functions.grantPermission(Web3.to_checksum_address(merchant), data_category, purpose, compensation_bps, upfront_fee, validity_period),
+            f"Grant Permission [{data_category}]", wait=wait, decode=self._permission_id_from_result
+        )
+
+    async def _permission_id_from_result(self, result):
+        logs = self.contract.events.PermissionGranted().process_receipt(result["receipt"])
+        if logs:
+            perm_id = logs[0]["args"]["permissionId"]
+            logger.info("Permission ID: %s", perm_id)
+            return perm_id
+        return await self.contract.functions.nextPermissionId().call() - 1
+
+    @instrumented
+    async def revoke_permission(self, permission_id, wait=True):
+        return await self._send_tx(self.contract.functions.revokePermission(permission_id), f"Revoke Permission #{permission_id}", wait=wait)
+
+    @instrumented
+    async def deposit_escrow(self, permission_id, amount, agent_id=0, wait=True):
+        terms = self.cache.get_terms(permission_id)
+        if terms is MISSING:
+            terms = await self.get_permission(permission_id)
+        total_needed = amount + terms["upfront_fee"]
+        await self.ensure_allowance(total_needed)
+        return await self._send_tx(
+            self.contract.functions.depositEscrow(permission_id, amount, agent_id),
+            f"Deposit Escrow [{self.raw_to_usdc(amount)} USDC]", wait=wait, decode=self._escrow_id_from_result
+        )
+
+    async def _escrow_id_from_result(self, result):
+        logs = self.contract.events.EscrowDeposited().process_receipt(result["receipt"])
+        if logs:
+            escrow_id = logs[0]["args"]["escrowId"]
+            logger.info("Escrow ID: %s", escrow_id)
+            return escrow_id
+        return await self.contract.functions.nextEscrowId().call() - 1
+
+    @instrumented
+    async def report_outcome(self, escrow_id, outcome_value, outcome_type, outcome_description, wait=True):
+        return await self._send_tx(
+            self.contract.functions.reportOutcome(escrow_id, outcome_value, outcome_type, outcome_description),
+            f"Report Outcome [Escrow #{escrow_id}]", wait=wait
+        )
+
+    @instrumented
+    async def settle(self, escrow_id, wait=True):
+        return await self._send_tx(self.contract.functions.settle(escrow_id), f"Settle [Escrow #{escrow_id}]", wait=wait)
+
+    @instrumented
+    async def dispute(self, escrow_id, reason, wait=True):
+        return await self._send_tx(self.contract.functions.disputeSettlement(escrow_id, reason), f"Dispute [Escrow #{escrow_id}]", wait=wait)
+
+    @instrumented
+    async def refund_escrow(self, escrow_id, wait=True):
+        return await self._send_tx(self.contract.functions.refundEscrow(escrow_id), f"Refund [Escrow #{escrow_id}]", wait=wait)
+
+    @instrumented
+    async def get_permission(self, permission_id):
+        perm = self.cache.get_permission(permission_id)
+        if perm is MISSING:
+            perm = decode_permission(await self.contract.functions.permissions(permission_id).call())
+            self.cache.store_permission(permission_id, perm)
+        return perm
+
+    @instrumented
+    async def get_escrow(self, escrow_id):
+        escrow = self.cache.get_escrow(escrow_id)
+        if escrow is MISSING:
+            escrow = decode_escrow(await self.contract.functions.escrows(escrow_id).call())
+            self.cache.store_escrow(escrow_id, escrow)
+        return escrow
+
+    @instrumented
+    async def check_access(self, permission_id, agent_address=None):
+        agent = Web3.to_checksum_address(agent_address or self.address)
+        access = self.cache.get_access(permission_id, agent)
+        if access is MISSING:
+            access = decode_access(await self.contract.functions.checkAccess(permission_id, agent).call())
+            self.cache.store_access(permission_id, agent, access)
+        return access
+
+    @instrumented
+    async def preview_settlement(self, escrow_id):
+        preview = self.cache.get_preview(escrow_id)
+        if preview is MISSING:
+            preview = decode_settlement(await self.contract.functions.previewSettlement(escrow_id).call())
+            self.cache.store_preview(escrow_id, preview)
+        return preview
+
+    @instrumented
+    async def get_user_permissions(self, user=None, offset=0, limit=50):
+        addr = user or self.address
+        return await self.contract.functions.getUserPermissions(Web3.to_checksum_address(addr), offset, limit).call()
+
+    @instrumented
+    async def get_permission_escrows(self, permission_id):
+        return await self.contract.functions.getPermissionEscrows(permission_id).call()
+
+    @instrumented
+    async def get_protocol_stats(self):
+        f = self.contract.functions
+        return decode_protocol_stats(*await self.batch_call([
+            f.totalProtocolFees(), f.totalSettledVolume(), f.nextPermissionId(),
+            f.nextEscrowId(), f.identityEnforced(), f.reputationEnforced(),
+        ]))
+
+    # ─── Batched reads ──────────────────────────────────────────────────
+
+    @instrumented
+    async def batch_call(self, calls):
+        chunks = list(chunked(list(calls), self.read_batch_size))
+        if self.multicall is not None:
+            parts = await asyncio.gather(*(self._multicall_chunk(c) for c in chunks))
+        else:
+            parts = await asyncio.gather(*(self._rpc_batch_chunk(c) for c in chunks))
+        return [r for part in parts for r in part]
+
+    async def _multicall_chunk(self, chunk):
+        returned = await self.multicall.functions.aggregate3(encode_aggregate3(chunk)).call()
+        return decode_aggregate3(self.w3.codec, chunk, returned)
+
+    async def _rpc_batch_chunk(self, chunk):
+        if not isinstance(self.w3.provider, AsyncJSONBaseProvider):
+            return await asyncio.gather(*(call.call() for call in chunk))
+        async with self.w3.batch_requests() as batch:
+            for call in chunk:
+                batch.add(call)
+            return await batch.async_execute()
+
+    async def _cached_batch(self, keys, lookup, store, make_call, decode):
+        """Serve keys from the cache and fetch only the misses in one batch."""
+        found, missing = cached_lookup(keys, lookup)
+        store_fetched(found, missing, await self.batch_call([make_call(key) for key in missing]), store, decode)
+        return [found[key] for key in keys]
+
+    @instrumented
+    async def get_permissions(self, permission_ids):
+        return await self._cached_batch(permission_ids, self.cache.get_permission, self.cache.store_permission, self.contract.functions.permissions, decode_permission)
+
+    @instrumented
+    async def get_escrows(self, escrow_ids):
+        return await self._cached_batch(escrow_ids, self.cache.get_escrow, self.cache.store_escrow, self.contract.functions.escrows, decode_escrow)
+
+    @instrumented
+    async def check_access_many(self, requests):
+        keys = [(perm_id, Web3.to_checksum_address(agent or self.address)) for perm_id, agent in requests]
+        return await self._cached_batch(
+            keys, lambda key: self.cache.get_access(*key), lambda key, access: self.cache.store_access(*key, access),
+            lambda key: self.contract.functions.checkAccess(*key), decode_access,
+        )
+
+    @instrumented
+    async def preview_settlements(self, escrow_ids):
+        return await self._cached_batch(escrow_ids, self.cache.get_preview, self.cache.store_preview, self.contract.functions.previewSettlement, decode_settlement)
@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import OrderedDict
+from .constants import PermissionStatus, EscrowStatus
+
+MISSING = object()
+FINAL_PERMISSION_STATUSES = (PermissionStatus.REVOKED, PermissionStatus.EXPIRED)
+FINAL_ESCROW_STATUSES = (EscrowStatus.SETTLED, EscrowStatus.REFUNDED)
+PERMISSION_TERMS = ("user", "merchant", "data_category", "purpose", "compensation_bps", "upfront_fee", "valid_until", "created_at")
+
+
+def cached_lookup(keys, lookup):
+    """Cached values for each distinct key, and the keys that missed, in first-seen order."""
+    found = {}
+    for key in keys:
+        if key not in found:
+            found[key] = lookup(key)
+    return found, [key for key, value in found.items() if value is MISSING]
+
+
+def store_fetched(found, missing, rows, store, decode):
+    """Fill the misses from fetched rows (None for failed reads), caching each decoded value."""
+    for key, row in zip(missing, rows):
+        found[key] = decode(row) if row is not None else None
+        if found[key] is not None:
+            store(key, found[key])
+
+
+def _copy(value):
+    # Callers get their own dict so mutating a result cannot poison the cache;
+    # values are copied on the way in too, as the caller keeps what it stored
+    return value if value is MISSING else dict(value)
+
+
+class TTLCache:
+    """Thread-safe LRU map whose entries expire after ttl seconds (ttl=None keeps them until evicted)."""
+
+    def __init__(self, maxsize=10_000, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > self.clock()):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, value, ttl=MISSING):
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is MISSING else ttl
+        with self._lock:
+            self._data[key] = (value, None if ttl is None else self.clock() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0, "size": len(self._data), "evictions": self.evictions}
+
+
+class StateCache:
+    """
+    Read cache for PrmissionV2 state, owned by the SDK.
+
+    Permission terms never change once granted and are kept until evicted.
+    Permission status, escrows, access checks and the USDC allowance are
+    kept for `ttl` seconds, except terminal states (revoked/expired
+    permissions, settled/refunded escrows) which cannot change again.
+    Entries are dropped when one of our own transactions touching them is
+    sent or confirmed, and when apply_event() sees a matching contract event
+    (e.g. registered as an EventIndexer listener). maxsize=0 disables caching.
+    """
+
+    def __init__(self, maxsize=10_000, ttl=5.0):
+        self.terms = TTLCache(maxsize, ttl=None)
+        self.permission_status = TTLCache(maxsize, ttl)
+        self.escrows = TTLCache(maxsize, ttl)
+        self.previews = TTLCache(maxsize, ttl=None)
+        self.access = TTLCache(maxsize, ttl)
+        self.allowance = TTLCache(min(maxsize, 16), ttl)
+
+    # ─── Permissions ────────────────────────────────────────────────────
+
+    def get_permission(self, permission_id):
+        terms = self.terms.get(permission_id)
+        if terms is MISSING:
+            return MISSING
+        status = self.permission_status.get(permission_id)
+        if status is MISSING:
+            return MISSING
+        return {**terms, **status}
+
+    def get_terms(self, permission_id):
+        return _copy(self.terms.get(permission_id))
+
+    def store_permission(self, permission_id, perm):
+        # An INACTIVE slot is an id that has not been granted yet
+        if perm["status"] == PermissionStatus.INACTIVE:
+            return
+        self.terms.set(permission_id, {k: perm[k] for k in PERMISSION_TERMS})
+        status = {"status": perm["status"], "status_name": perm["status_name"], "revoked_at": perm["revoked_at"]}
+        self.permission_status.set(permission_id, status, ttl=None if perm["status"] in FINAL_PERMISSION_STATUSES else MISSING)
+
+    def invalidate_permission(self, permission_id):
+        self.permission_status.invalidate(permission_id)
+        self.access.invalidate_where(lambda key: key[0] == permission_id)
+
+    # ─── Escrows ────────────────────────────────────────────────────────
+
+    def get_escrow(self, escrow_id):
+        return _copy(self.escrows.get(escrow_id))
+
+    def store_escrow(self, escrow_id, escrow):
+        if escrow["status"] == EscrowStatus.NONE:
+            return
+        self.escrows.set(escrow_id, _copy(escrow), ttl=None if escrow["status"] in FINAL_ESCROW_STATUSES else MISSING)
+
+    def get_preview(self, escrow_id):
+        return _copy(self.previews.get(escrow_id))
+
+    def store_preview(self, escrow_id, preview):
+        # Payouts only depend on the escrow amount and the permission's bps, both fixed
+        if preview["user_share"] or preview["protocol_fee"] or preview["agent_refund"]:
+            self.previews.set(escrow_id, _copy(preview))
+
+    def invalidate_escrow(self, escrow_id):
+        self.escrows.invalidate(escrow_id)
+
+    # ─── Access / allowance ─────────────────────────────────────────────
+
+    def get_access(self, permission_id, agent):
+        return _copy(self.access.get((permission_id, agent)))
+
+    def store_access(self, permission_id, agent, access):
+        self.access.set((permission_id, agent), _copy(access))
+
+    def get_allowance(self, owner):
+        return self.allowance.get(owner)
+
+    def store_allowance(self, owner, amount):
+        self.allowance.set(owner, amount)
+
+    def invalidate_allowance(self, owner):
+        self.allowance.invalidate(owner)
+
+    # ─── Invalidation ───────────────────────────────────────────────────
+
+    def on_transaction(self, sender, fn_name, args):
+        """Drop whatever a transaction we sent may have changed."""
+        if fn_name == "revokePermission":
+            self.invalidate_permission(args[0])
+        elif fn_name in ("approve", "depositEscrow"):
+            self.invalidate_allowance(sender)
+        elif fn_name in ("reportOutcome", "disputeSettlement", "settle", "refundEscrow"):
+            self.invalidate_escrow(args[0])
+
+    def apply_event(self, name, args):
+        if name in ("PermissionRevoked", "PermissionExpired"):
+            self.invalidate_permission(args["permissionId"])
+        elif name in ("OutcomeReported", "DisputeFiled", "DisputeResolved", "SettlementCompleted", "EscrowRefunded"):
+            self.invalidate_escrow(args["escrowId"])
+
+    def clear(self):
+        for cache in (self.terms, self.permission_status, self.escrows, self.previews, self.access, self.allowance):
+            cache.clear()
+
+    def stats(self):
+        return {
+            "terms": self.terms.stats(), "permission_status": self.permission_status.stats(),
+            "escrows": self.escrows.stats(), "previews": self.previews.stats(),
+            "access": self.access.stats(), "allowance": self.allowance.stats(),
+        }
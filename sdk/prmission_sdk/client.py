@@ -1,140 +1,360 @@
+import logging
 import time
+from functools import cached_property
 from typing import Optional, Tuple, Dict, Any
 from web3 import Web3
-from web3.middleware import ExtraDataToPOAMiddleware
+from web3.providers import JSONBaseProvider
+from web3.exceptions import TimeExhausted, TransactionNotFound
 from .constants import (
     PRMISSION_V2_ADDRESS, USDC_BASE_ADDRESS, BASE_MAINNET_RPC, BASE_CHAIN_ID,
-    PRMISSION_V2_ABI, ERC20_ABI, USDC_DECIMALS, PROTOCOL_FEE_BPS,
+    MULTICALL3_ADDRESS, READ_BATCH_SIZE, PROTOCOL_FEE_BPS,
     BPS_DENOMINATOR, DISPUTE_WINDOW, PermissionStatus, EscrowStatus,
 )
+from .decode import (
+    usdc_to_raw, raw_to_usdc, decode_permission, decode_escrow, decode_access,
+    decode_settlement, decode_protocol_stats, chunked,
+)
+from .multicall import encode_aggregate3, decode_aggregate3
+from .cache import StateCache, MISSING, cached_lookup, store_fetched
+from .nonce import NonceManager
+from .fees import FeeOracle, GasEstimateCache
+from .rpc import make_w3
+from .metrics import DEFAULT_REGISTRY, instrumented
+from .contracts import shared_connection
+from .tx import ALREADY_KNOWN, RESYNC, UNCONFIRMED, BasePendingTx, record_sent, send_error_action
+
+logger = logging.getLogger(__name__)
+
+
+class PendingTx(BasePendingTx):
+    """Handle for a broadcast transaction. Call result() to block until it is mined."""
+
+    def _late_receipt(self, timeout_error):
+        # Mined just after the timeout, replaced by another transaction, or still pending
+        try:
+            return self.sdk.w3.eth.get_transaction_receipt(self.tx_hash)
+        except TransactionNotFound:
+            pass
+        if self._replaced(self.sdk.w3.eth.get_transaction_count(self.sdk.address)):
+            raise Exception(f"Transaction replaced: {self.tx_hash.hex()}") from timeout_error
+        raise timeout_error
+
+    def receipt(self, timeout=120):
+        if self._receipt is not None:
+            return self._receipt
+        metrics = self.sdk.metrics
+        try:
+            with metrics.timer("tx_phase_seconds", phase="receipt_wait", fn=self.fn_name):
+                receipt = self.sdk.w3.eth.wait_for_transaction_receipt(self.tx_hash, timeout=timeout)
+        except TimeExhausted as e:
+            metrics.inc("tx_timeouts_total", fn=self.fn_name)
+            receipt = self._late_receipt(e)
+        return self._accept(receipt)
+
+    def result(self, timeout=120):
+        result = {"tx_hash": self.tx_hash.hex(), "receipt": self.receipt(timeout)}
+        if self._decode is None:
+            return result
+        with self.sdk.metrics.timer("tx_phase_seconds", phase="decode", fn=self.fn_name):
+            return self._decode(result)
+
 
 class PrmissionSDK:
-    def __init__(self, private_key, rpc_url=BASE_MAINNET_RPC, contract_address=PRMISSION_V2_ADDRESS, usdc_address=USDC_BASE_ADDRESS, gas_multiplier=1.2):
-        self.w3 = Web3(Web3.HTTPProvider(rpc_url))
-        self.w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
-        if not self.w3.is_connected():
-            raise ConnectionError(f"Cannot connect to {rpc_url}")
+    def __init__(self, private_key, rpc_url=BASE_MAINNET_RPC, contract_address=PRMISSION_V2_ADDRESS, usdc_address=USDC_BASE_ADDRESS, gas_multiplier=1.2, nonce_retries=2, chain_id=BASE_CHAIN_ID, multicall_address=MULTICALL3_ADDRESS, read_batch_size=READ_BATCH_SIZE, cache_size=10_000, cache_ttl=5.0, metrics=None, fee_max_age=2.0, gas_cache_ttl=300.0):
+        self.rpc_url = rpc_url
+        self.metrics = metrics if metrics is not None else DEFAULT_REGISTRY
+        endpoint = tuple(rpc_url) if isinstance(rpc_url, list) else rpc_url
+        self.connection = shared_connection(("sync", endpoint, id(self.metrics)), lambda: make_w3(rpc_url, self.metrics))
+        self.w3 = self.connection.w3
         self.account = self.w3.eth.account.from_key(private_key)
         self.address = self.account.address
         self.gas_multiplier = gas_multiplier
-        self.contract = self.w3.eth.contract(address=Web3.to_checksum_address(contract_address), abi=PRMISSION_V2_ABI)
-        self.usdc = self.w3.eth.contract(address=Web3.to_checksum_address(usdc_address), abi=ERC20_ABI)
-        print(f"SDK initialized | Address: {self.address} | Base Mainnet")
-
-    def _send_tx(self, tx_func, description=""):
-        nonce = self.w3.eth.get_transaction_count(self.address)
-        tx = tx_func.build_transaction({
-            "from": self.address, "nonce": nonce, "chainId": BASE_CHAIN_ID,
-            "gas": 0, "maxFeePerGas": self.w3.eth.gas_price + self.w3.to_wei(1, "gwei"),
-            "maxPriorityFeePerGas": self.w3.to_wei(0.001, "gwei"),
-        })
-        gas_estimate = self.w3.eth.estimate_gas(tx)
+        self.nonce_retries = nonce_retries
+        self.chain_id = chain_id
+        self.nonces = NonceManager()
+        self.fees = FeeOracle(self.w3, max_age=fee_max_age)
+        self.gas_estimates = GasEstimateCache(gas_cache_ttl)
+        self.contract_address = contract_address
+        self.usdc_address = usdc_address
+        self.multicall_address = multicall_address
+        self.read_batch_size = read_batch_size
+        self.cache = StateCache(cache_size, cache_ttl)
+        logger.info("SDK initialized | Address: %s | Base Mainnet", self.address)
+
+    # ─── Contracts (built on first use, shared per endpoint) ────────────
+
+    @cached_property
+    def contract(self):
+        return self.connection.contract("prmission", self.contract_address)
+
+    @cached_property
+    def usdc(self):
+        return self.connection.contract("erc20", self.usdc_address)
+
+    @cached_property
+    def multicall(self):
+        return self.connection.contract("multicall3", self.multicall_address) if self.multicall_address else None
+
+    def connect(self):
+        """Optional: fail fast if the RPC endpoint is unreachable. Construction itself makes no network calls."""
+        if not self.w3.is_connected():
+            raise ConnectionError(f"Cannot connect to {self.rpc_url}")
+        return self
+
+    def _chain_nonce(self):
+        return self.w3.eth.get_transaction_count(self.address, "pending")
+
+    def _find_sent(self, signed, nonce):
+        # The send failed without a verdict from the node; it may still have gone through
+        try:
+            self.w3.eth.get_transaction(signed.hash)
+            return ALREADY_KNOWN
+        except TransactionNotFound:
+            self.nonces.release(nonce)
+        except Exception:
+            # Can't tell: take the nonce from the chain again on the next send
+            self.nonces.reset()
+        return None
+
+    def submit_tx(self, tx_func, description="", decode=None):
+        fn_name = tx_func.fn_name
+        timer = self.metrics.timer
+        with timer("tx_phase_seconds", phase="fees", fn=fn_name):
+            fees = self.fees.suggest()
+        with timer("tx_phase_seconds", phase="build", fn=fn_name):
+            tx = tx_func.build_transaction({"from": self.address, "chainId": self.chain_id, "gas": 0, **fees})
+        gas_profile = self.gas_estimates.profile(tx_func)
+        gas_estimate = self.gas_estimates.get(gas_profile)
+        if gas_estimate is MISSING:
+            with timer("tx_phase_seconds", phase="estimate_gas", fn=fn_name):
+                gas_estimate = self.w3.eth.estimate_gas(tx)
+            self.gas_estimates.store(gas_profile, gas_estimate)
         tx["gas"] = int(gas_estimate * self.gas_multiplier)
-        signed = self.account.sign_transaction(tx)
-        tx_hash = self.w3.eth.send_raw_transaction(signed.raw_transaction)
-        print(f"  Sent: {description} | tx: {tx_hash.hex()}")
-        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
-        if receipt["status"] == 1:
-            print(f"  Confirmed in block {receipt['blockNumber']} | https://basescan.org/tx/{tx_hash.hex()}")
-        else:
-            raise Exception(f"Transaction failed: {tx_hash.hex()}")
-        return {"tx_hash": tx_hash.hex(), "receipt": receipt}
+        # Nonce is taken last so a failed build or estimate never leaves a gap
+        for attempt in range(self.nonce_retries + 1):
+            with timer("tx_phase_seconds", phase="nonce", fn=fn_name):
+                tx["nonce"] = self.nonces.next(self._chain_nonce)
+            with timer("tx_phase_seconds", phase="sign", fn=fn_name):
+                signed = self.account.sign_transaction(tx)
+            try:
+                with timer("tx_phase_seconds", phase="send", fn=fn_name):
+                    tx_hash = self.w3.eth.send_raw_transaction(signed.raw_transaction)
+                break
+            except Exception as e:
+                action = send_error_action(self, e, tx["nonce"], fn_name, attempt < self.nonce_retries)
+                if action == UNCONFIRMED:
+                    action = self._find_sent(signed, tx["nonce"])
+                if action == ALREADY_KNOWN:
+                    tx_hash = signed.hash
+                    break
+                if action == RESYNC:
+                    # Nonce too low: continue from the chain's
+                    self.nonces.resync(self._chain_nonce())
+                    if attempt < self.nonce_retries:
+                        continue
+                raise
+        record_sent(self, tx_func, tx, tx_hash, description, gas_estimate)
+        return PendingTx(self, tx_hash, tx["nonce"], description, decode, tx_func, gas_estimate, gas_profile)
+
+    def _send_tx(self, tx_func, description="", wait=True, decode=None):
+        pending = self.submit_tx(tx_func, description, decode)
+        if not wait:
+            return pending
+        return pending.result()
+
+    def wait_all(self, pending_txs, timeout=120):
+        return [p.result(timeout) for p in pending_txs]
 
     def usdc_to_raw(self, amount):
-        return int(amount * (10 ** USDC_DECIMALS))
+        return usdc_to_raw(amount)
 
     def raw_to_usdc(self, raw):
-        return raw / (10 ** USDC_DECIMALS)
+        return raw_to_usdc(raw)
 
+    @instrumented
     def usdc_balance(self):
         return self.usdc.functions.balanceOf(self.address).call()
 
+    @instrumented
     def usdc_allowance(self):
-        return self.usdc.functions.allowance(self.address, self.contract.address).call()
+        amount = self.cache.get_allowance(self.address)
+        if amount is MISSING:
+            amount = self.usdc.functions.allowance(self.address, self.contract.address).call()
+            self.cache.store_allowance(self.address, amount)
+        return amount
 
-    def approve_usdc(self, amount):
-        return self._send_tx(self.usdc.functions.approve(self.contract.address, amount), f"Approve {self.raw_to_usdc(amount)} USDC")
+    @instrumented
+    def approve_usdc(self, amount, wait=True):
+        return self._send_tx(self.usdc.functions.approve(self.contract.address, amount), f"Approve {self.raw_to_usdc(amount)} USDC", wait=wait)
 
+    @instrumented
     def ensure_allowance(self, amount):
         current = self.usdc_allowance()
         if current < amount:
-            print(f"  Approving USDC...")
+            logger.info("Approving USDC...")
             self.approve_usdc(2**256 - 1)
 
-    def grant_permission(self, data_category, purpose, compensation_bps, validity_period, merchant="0x0000000000000000000000000000000000000000", upfront_fee=0):
-        result = self._send_tx(
+    @instrumented
+    def grant_permission(self, data_category, purpose, compensation_bps, validity_period, merchant="0x0000000000000000000000000000000000000000", upfront_fee=0, wait=True):
+        return self._send_tx(
             self.contract.functions.grantPermission(Web3.to_checksum_address(merchant), data_category, purpose, compensation_bps, upfront_fee, validity_period),
-            f"Grant Permission [{data_category}]"
+            f"Grant Permission [{data_category}]", wait=wait, decode=self._permission_id_from_result
         )
+
+    def _permission_id_from_result(self, result):
         logs = self.contract.events.PermissionGranted().process_receipt(result["receipt"])
         if logs:
             perm_id = logs[0]["args"]["permissionId"]
-            print(f"  Permission ID: {perm_id}")
+            logger.info("Permission ID: %s", perm_id)
             return perm_id
         return self.contract.functions.nextPermissionId().call() - 1
 
-    def revoke_permission(self, permission_id):
-        return self._send_tx(self.contract.functions.revokePermission(permission_id), f"Revoke Permission #{permission_id}")
+    @instrumented
+    def revoke_permission(self, permission_id, wait=True):
+        return self._send_tx(self.contract.functions.revokePermission(permission_id), f"Revoke Permission #{permission_id}", wait=wait)
 
-    def deposit_escrow(self, permission_id, amount, agent_id=0):
-        perm = self.get_permission(permission_id)
-        total_needed = amount + perm["upfront_fee"]
+    @instrumented
+    def deposit_escrow(self, permission_id, amount, agent_id=0, wait=True):
+        terms = self.cache.get_terms(permission_id)
+        if terms is MISSING:
+            terms = self.get_permission(permission_id)
+        total_needed = amount + terms["upfront_fee"]
         self.ensure_allowance(total_needed)
-        result = self._send_tx(
+        return self._send_tx(
             self.contract.functions.depositEscrow(permission_id, amount, agent_id),
-            f"Deposit Escrow [{self.raw_to_usdc(amount)} USDC]"
+            f"Deposit Escrow [{self.raw_to_usdc(amount)} USDC]", wait=wait, decode=self._escrow_id_from_result
         )
+
+    def _escrow_id_from_result(self, result):
         logs = self.contract.events.EscrowDeposited().process_receipt(result["receipt"])
         if logs:
             escrow_id = logs[0]["args"]["escrowId"]
-            print(f"  Escrow ID: {escrow_id}")
+            logger.info("Escrow ID: %s", escrow_id)
             return escrow_id
         return self.contract.functions.nextEscrowId().call() - 1
 
-    def report_outcome(self, escrow_id, outcome_value, outcome_type, outcome_description):
+    @instrumented
+    def report_outcome(self, escrow_id, outcome_value, outcome_type, outcome_description, wait=True):
         return self._send_tx(
             self.contract.functions.reportOutcome(escrow_id, outcome_value, outcome_type, outcome_description),
-            f"Report Outcome [Escrow #{escrow_id}]"
+            f"Report Outcome [Escrow #{escrow_id}]", wait=wait
         )
 
-    def settle(self, escrow_id):
-        return self._send_tx(self.contract.functions.settle(escrow_id), f"Settle [Escrow #{escrow_id}]")
+    @instrumented
+    def settle(self, escrow_id, wait=True):
+        return self._send_tx(self.contract.functions.settle(escrow_id), f"Settle [Escrow #{escrow_id}]", wait=wait)
 
-    def dispute(self, escrow_id, reason):
-        return self._send_tx(self.contract.functions.disputeSettlement(escrow_id, reason), f"Dispute [Escrow #{escrow_id}]")
+    @instrumented
+    def dispute(self, escrow_id, reason, wait=True):
+        return self._send_tx(self.contract.functions.disputeSettlement(escrow_id, reason), f"Dispute [Escrow #{escrow_id}]", wait=wait)
 
-    def refund_escrow(self, escrow_id):
-        return self._send_tx(self.contract.functions.refundEscrow(escrow_id), f"Refund [Escrow #{escrow_id}]")
+    @instrumented
+    def refund_escrow(self, escrow_id, wait=True):
+        return self._send_tx(self.contract.functions.refundEscrow(escrow_id), f"Refund [Escrow #{escrow_id}]", wait=wait)
 
+    @instrumented
     def get_permission(self, permission_id):
-        p = self.contract.functions.permissions(permission_id).call()
-        return {"user": p[0], "merchant": p[1], "data_category": p[2], "purpose": p[3], "compensation_bps": p[4], "upfront_fee": p[5], "valid_until": p[6], "status": p[7], "status_name": ["INACTIVE","ACTIVE","REVOKED","EXPIRED"][p[7]], "created_at": p[8], "revoked_at": p[9]}
+        perm = self.cache.get_permission(permission_id)
+        if perm is MISSING:
+            perm = decode_permission(self.contract.functions.permissions(permission_id).call())
+            self.cache.store_permission(permission_id, perm)
+        return perm
 
+    @instrumented
     def get_escrow(self, escrow_id):
-        e = self.contract.functions.escrows(escrow_id).call()
-        return {"permission_id": e[0], "agent": e[1], "agent_id": e[2], "amount": e[3], "amount_usdc": self.raw_to_usdc(e[3]), "outcome_value": e[4], "outcome_type": e[5], "outcome_description": e[6], "reported_at": e[7], "status": e[8], "status_name": ["NONE","FUNDED","OUTCOME_REPORTED","DISPUTED","SETTLED","REFUNDED"][e[8]], "created_at": e[9]}
+        escrow = self.cache.get_escrow(escrow_id)
+        if escrow is MISSING:
+            escrow = decode_escrow(self.contract.functions.escrows(escrow_id).call())
+            self.cache.store_escrow(escrow_id, escrow)
+        return escrow
 
+    @instrumented
     def check_access(self, permission_id, agent_address=None):
-        agent = agent_address or self.address
-        result = self.contract.functions.checkAccess(permission_id, Web3.to_checksum_address(agent)).call()
-        return {"permitted": result[0], "compensation_bps": result[1], "upfront_fee": result[2], "valid_until": result[3]}
+        agent = Web3.to_checksum_address(agent_address or self.address)
+        access = self.cache.get_access(permission_id, agent)
+        if access is MISSING:
+            access = decode_access(self.contract.functions.checkAccess(permission_id, agent).call())
+            self.cache.store_access(permission_id, agent, access)
+        return access
 
+    @instrumented
     def preview_settlement(self, escrow_id):
-        result = self.contract.functions.previewSettlement(escrow_id).call()
-        return {"user_share": result[0], "user_share_usdc": self.raw_to_usdc(result[0]), "protocol_fee": result[1], "protocol_fee_usdc": self.raw_to_usdc(result[1]), "agent_refund": result[2], "agent_refund_usdc": self.raw_to_usdc(result[2])}
+        preview = self.cache.get_preview(escrow_id)
+        if preview is MISSING:
+            preview = decode_settlement(self.contract.functions.previewSettlement(escrow_id).call())
+            self.cache.store_preview(escrow_id, preview)
+        return preview
 
+    @instrumented
     def get_user_permissions(self, user=None, offset=0, limit=50):
         addr = user or self.address
         return self.contract.functions.getUserPermissions(Web3.to_checksum_address(addr), offset, limit).call()
 
+    @instrumented
     def get_permission_escrows(self, permission_id):
         return self.contract.functions.getPermissionEscrows(permission_id).call()
 
+    @instrumented
     def get_protocol_stats(self):
-        fees = self.contract.functions.totalProtocolFees().call()
-        volume = self.contract.functions.totalSettledVolume().call()
-        next_perm = self.contract.functions.nextPermissionId().call()
-        next_esc = self.contract.functions.nextEscrowId().call()
-        identity = self.contract.functions.identityEnforced().call()
-        reputation = self.contract.functions.reputationEnforced().call()
-        return {"total_protocol_fees_usdc": self.raw_to_usdc(fees), "total_settled_volume_usdc": self.raw_to_usdc(volume), "total_permissions": next_perm - 1, "total_escrows": next_esc - 1, "identity_enforced": identity, "reputation_enforced": reputation}
+        f = self.contract.functions
+        return decode_protocol_stats(*self.batch_call([
+            f.totalProtocolFees(), f.totalSettledVolume(), f.nextPermissionId(),
+            f.nextEscrowId(), f.identityEnforced(), f.reputationEnforced(),
+        ]))
+
+    # ─── Batched reads ──────────────────────────────────────────────────
+
+    @instrumented
+    def batch_call(self, calls):
+        """
+        Execute view calls in chunks of read_batch_size, through Multicall3
+        aggregate3 or, when multicall_address is None, JSON-RPC batch requests.
+        Results come back in order; a call that reverted inside Multicall3
+        yields None.
+        """
+        results = []
+        for chunk in chunked(list(calls), self.read_batch_size):
+            if self.multicall is not None:
+                results.extend(self._multicall_chunk(chunk))
+            else:
+                results.extend(self._rpc_batch_chunk(chunk))
+        return results
+
+    def _multicall_chunk(self, chunk):
+        returned = self.multicall.functions.aggregate3(encode_aggregate3(chunk)).call()
+        return decode_aggregate3(self.w3.codec, chunk, returned)
+
+    def _rpc_batch_chunk(self, chunk):
+        # Providers without JSON-RPC batching (e.g. eth-tester) fall back to one call each
+        if not isinstance(self.w3.provider, JSONBaseProvider):
+            return [call.call() for call in chunk]
+        with self.w3.batch_requests() as batch:
+            for call in chunk:
+                batch.add(call)
+            return batch.execute()
+
+    def _cached_batch(self, keys, lookup, store, make_call, decode):
+        """Serve keys from the cache and fetch only the misses in one batch."""
+        found, missing = cached_lookup(keys, lookup)
+        store_fetched(found, missing, self.batch_call([make_call(key) for key in missing]), store, decode)
+        return [found[key] for key in keys]
+
+    @instrumented
+    def get_permissions(self, permission_ids):
+        return self._cached_batch(permission_ids, self.cache.get_permission, self.cache.store_permission, self.contract.functions.permissions, decode_permission)
+
+    @instrumented
+    def get_escrows(self, escrow_ids):
+        return self._cached_batch(escrow_ids, self.cache.get_escrow, self.cache.store_escrow, self.contract.functions.escrows, decode_escrow)
+
+    @instrumented
+    def check_access_many(self, requests):
+        keys = [(perm_id, Web3.to_checksum_address(agent or self.address)) for perm_id, agent in requests]
+        return self._cached_batch(
+            keys, lambda key: self.cache.get_access(*key), lambda key, access: self.cache.store_access(*key, access),
+            lambda key: self.contract.functions.checkAccess(*key), decode_access,
+        )
+
+    @instrumented
+    def preview_settlements(self, escrow_ids):
+        return self._cached_batch(escrow_ids, self.cache.get_preview, self.cache.store_preview, self.contract.functions.previewSettlement, decode_settlement)
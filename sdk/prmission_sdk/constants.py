@@ -8,6 +8,8 @@ DISPUTE_WINDOW = 86400
 REVOCATION_GRACE = 60
 MAX_COMPENSATION_BPS = 5000
 USDC_DECIMALS = 6
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+READ_BATCH_SIZE = 200
 
 class PermissionStatus:
     INACTIVE = 0
@@ -30,6 +32,10 @@ ERC20_ABI = [
     {"inputs":[],"name":"decimals","outputs":[{"name":"","type":"uint8"}],"stateMutability":"view","type":"function"}
 ]
 
+MULTICALL3_ABI = [
+    {"inputs":[{"components":[{"name":"target","type":"address"},{"name":"allowFailure","type":"bool"},{"name":"callData","type":"bytes"}],"name":"calls","type":"tuple[]"}],"name":"aggregate3","outputs":[{"components":[{"name":"success","type":"bool"},{"name":"returnData","type":"bytes"}],"name":"returnData","type":"tuple[]"}],"stateMutability":"payable","type":"function"}
+]
+
 PRMISSION_V2_ABI = [
     {"inputs":[{"name":"merchant","type":"address"},{"name":"dataCategory","type":"string"},{"name":"purpose","type":"string"},{"name":"compensationBps","type":"uint256"},{"name":"upfrontFee","type":"uint256"},{"name":"validityPeriod","type":"uint256"}],"name":"grantPermission","outputs":[{"name":"permissionId","type":"uint256"}],"stateMutability":"nonpayable","type":"function"},
     {"inputs":[{"name":"permissionId","type":"uint256"}],"name":"revokePermission","outputs":[],"stateMutability":"nonpayable","type":"function"},
@@ -54,7 +60,12 @@ PRMISSION_V2_ABI = [
     {"inputs":[],"name":"identityEnforced","outputs":[{"name":"","type":"bool"}],"stateMutability":"view","type":"function"},
     {"inputs":[],"name":"reputationEnforced","outputs":[{"name":"","type":"bool"}],"stateMutability":"view","type":"function"},
     {"anonymous":False,"inputs":[{"indexed":True,"name":"permissionId","type":"uint256"},{"indexed":True,"name":"user","type":"address"},{"indexed":True,"name":"merchant","type":"address"},{"indexed":False,"name":"dataCategory","type":"string"},{"indexed":False,"name":"purpose","type":"string"},{"indexed":False,"name":"compensationBps","type":"uint256"},{"indexed":False,"name":"upfrontFee","type":"uint256"},{"indexed":False,"name":"validUntil","type":"uint256"}],"name":"PermissionGranted","type":"event"},
+    {"anonymous":False,"inputs":[{"indexed":True,"name":"permissionId","type":"uint256"},{"indexed":True,"name":"user","type":"address"},{"indexed":False,"name":"revokedAt","type":"uint256"},{"indexed":False,"name":"graceEndsAt","type":"uint256"}],"name":"PermissionRevoked","type":"event"},
+    {"anonymous":False,"inputs":[{"indexed":True,"name":"permissionId","type":"uint256"}],"name":"PermissionExpired","type":"event"},
     {"anonymous":False,"inputs":[{"indexed":True,"name":"escrowId","type":"uint256"},{"indexed":True,"name":"permissionId","type":"uint256"},{"indexed":True,"name":"agent","type":"address"},{"indexed":False,"name":"agentId","type":"uint256"},{"indexed":False,"name":"amount","type":"uint256"}],"name":"EscrowDeposited","type":"event"},
     {"anonymous":False,"inputs":[{"indexed":True,"name":"escrowId","type":"uint256"},{"indexed":False,"name":"outcomeValue","type":"uint256"},{"indexed":False,"name":"outcomeType","type":"string"},{"indexed":False,"name":"disputeWindowEnd","type":"uint256"}],"name":"OutcomeReported","type":"event"},
-    {"anonymous":False,"inputs":[{"indexed":True,"name":"escrowId","type":"uint256"},{"indexed":False,"name":"userShare","type":"uint256"},{"indexed":False,"name":"protocolFee","type":"uint256"},{"indexed":False,"name":"agentRefund","type":"uint256"}],"name":"SettlementCompleted","type":"event"}
+    {"anonymous":False,"inputs":[{"indexed":True,"name":"escrowId","type":"uint256"},{"indexed":False,"name":"userShare","type":"uint256"},{"indexed":False,"name":"protocolFee","type":"uint256"},{"indexed":False,"name":"agentRefund","type":"uint256"}],"name":"SettlementCompleted","type":"event"},
+    {"anonymous":False,"inputs":[{"indexed":True,"name":"escrowId","type":"uint256"},{"indexed":True,"name":"disputant","type":"address"},{"indexed":False,"name":"reason","type":"string"}],"name":"DisputeFiled","type":"event"},
+    {"anonymous":False,"inputs":[{"indexed":True,"name":"escrowId","type":"uint256"},{"indexed":False,"name":"userShare","type":"uint256"},{"indexed":False,"name":"protocolFee","type":"uint256"},{"indexed":False,"name":"agentRefund","type":"uint256"}],"name":"DisputeResolved","type":"event"},
+    {"anonymous":False,"inputs":[{"indexed":True,"name":"escrowId","type":"uint256"},{"indexed":True,"name":"agent","type":"address"},{"indexed":False,"name":"amount","type":"uint256"}],"name":"EscrowRefunded","type":"event"}
 ]
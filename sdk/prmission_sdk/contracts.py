@@ -0,0 +1,42 @@
+import threading
+from .constants import PRMISSION_V2_ABI, ERC20_ABI, MULTICALL3_ABI
+
+ABIS = {"prmission": PRMISSION_V2_ABI, "erc20": ERC20_ABI, "multicall3": MULTICALL3_ABI}
+
+_connections = {}
+_lock = threading.Lock()
+
+
+class Connection:
+    """
+    A Web3 (or AsyncWeb3) instance with its middleware, plus one contract
+    factory per ABI and one contract object per address, shared by every
+    client talking to the same endpoint. Building these parses the ABI, so
+    it is done once per process, on first use.
+    """
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self._factories = {}
+        self._contracts = {}
+        self._lock = threading.Lock()
+
+    def contract(self, name, address):
+        address = self.w3.to_checksum_address(address)
+        with self._lock:
+            contract = self._contracts.get((name, address))
+            if contract is None:
+                factory = self._factories.get(name)
+                if factory is None:
+                    factory = self._factories[name] = self.w3.eth.contract(abi=ABIS[name])
+                contract = self._contracts[(name, address)] = factory(address=address)
+            return contract
+
+
+def shared_connection(key, make_w3):
+    """The Connection for `key`, creating it with make_w3() the first time."""
+    with _lock:
+        connection = _connections.get(key)
+        if connection is None:
+            connection = _connections[key] = Connection(make_w3())
+        return connection
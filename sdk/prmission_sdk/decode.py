@@ -0,0 +1,37 @@
+from .constants import USDC_DECIMALS
+
+PERMISSION_STATUS_NAMES = ["INACTIVE", "ACTIVE", "REVOKED", "EXPIRED"]
+ESCROW_STATUS_NAMES = ["NONE", "FUNDED", "OUTCOME_REPORTED", "DISPUTED", "SETTLED", "REFUNDED"]
+
+
+def usdc_to_raw(amount):
+    return int(amount * (10 ** USDC_DECIMALS))
+
+
+def raw_to_usdc(raw):
+    return raw / (10 ** USDC_DECIMALS)
+
+
+def decode_permission(p):
+    return {"user": p[0], "merchant": p[1], "data_category": p[2], "purpose": p[3], "compensation_bps": p[4], "upfront_fee": p[5], "valid_until": p[6], "status": p[7], "status_name": PERMISSION_STATUS_NAMES[p[7]], "created_at": p[8], "revoked_at": p[9]}
+
+
+def decode_escrow(e):
+    return {"permission_id": e[0], "agent": e[1], "agent_id": e[2], "amount": e[3], "amount_usdc": raw_to_usdc(e[3]), "outcome_value": e[4], "outcome_type": e[5], "outcome_description": e[6], "reported_at": e[7], "status": e[8], "status_name": ESCROW_STATUS_NAMES[e[8]], "created_at": e[9]}
+
+
+def decode_access(r):
+    return {"permitted": r[0], "compensation_bps": r[1], "upfront_fee": r[2], "valid_until": r[3]}
+
+
+def decode_settlement(r):
+    return {"user_share": r[0], "user_share_usdc": raw_to_usdc(r[0]), "protocol_fee": r[1], "protocol_fee_usdc": raw_to_usdc(r[1]), "agent_refund": r[2], "agent_refund_usdc": raw_to_usdc(r[2])}
+
+
+def decode_protocol_stats(fees, volume, next_perm, next_esc, identity, reputation):
+    return {"total_protocol_fees_usdc": raw_to_usdc(fees), "total_settled_volume_usdc": raw_to_usdc(volume), "total_permissions": next_perm - 1, "total_escrows": next_esc - 1, "identity_enforced": identity, "reputation_enforced": reputation}
+
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
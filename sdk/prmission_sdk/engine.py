@@ -0,0 +1,174 @@
+"""
+Offline mirror of PrmissionV2's settlement math and access rules.
+
+Every function reproduces the contract's integer arithmetic (floor division,
+checked subtraction) so results match previewSettlement / checkAccess /
+settle / resolveDispute exactly, without an RPC round trip. Pure Python and
+web3-free; the *_batch helpers need numpy.
+"""
+from numbers import Integral
+
+from .constants import (
+    PROTOCOL_FEE_BPS, BPS_DENOMINATOR, DISPUTE_WINDOW, REVOCATION_GRACE,
+    MAX_COMPENSATION_BPS, PermissionStatus, EscrowStatus,
+)
+from .decode import raw_to_usdc
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+UINT256_MAX = 2**256 - 1
+
+
+def _uint(value, name):
+    if not 0 <= value <= UINT256_MAX:
+        raise ValueError(f"{name} out of uint256 range: {value}")
+    return value
+
+
+def settlement_split(amount, compensation_bps):
+    """(userShare, protocolFee, agentRefund) as computed by settle(). Raises ArithmeticError where Solidity would revert."""
+    _uint(amount, "amount")
+    _uint(compensation_bps, "compensation_bps")
+    user_share = amount * compensation_bps // BPS_DENOMINATOR
+    protocol_fee = amount * PROTOCOL_FEE_BPS // BPS_DENOMINATOR
+    if amount * max(compensation_bps, PROTOCOL_FEE_BPS) > UINT256_MAX or user_share + protocol_fee > amount:
+        raise ArithmeticError("settlement overflows/underflows (Solidity panic 0x11)")
+    return user_share, protocol_fee, amount - user_share - protocol_fee
+
+
+def dispute_split(amount, user_bps):
+    """(userShare, protocolFee, agentRefund) as computed by resolveDispute(). Raises ArithmeticError where Solidity would revert."""
+    _uint(amount, "amount")
+    _uint(user_bps, "user_bps")
+    if user_bps > BPS_DENOMINATOR:
+        raise ValueError("userBps exceeds 100%")
+    if amount * PROTOCOL_FEE_BPS > UINT256_MAX:
+        raise ArithmeticError("dispute split overflows (Solidity panic 0x11)")
+    protocol_fee = amount * PROTOCOL_FEE_BPS // BPS_DENOMINATOR
+    distributable = amount - protocol_fee
+    if distributable * user_bps > UINT256_MAX:
+        raise ArithmeticError("dispute split overflows (Solidity panic 0x11)")
+    user_share = distributable * user_bps // BPS_DENOMINATOR
+    return user_share, protocol_fee, distributable - user_share
+
+
+def preview_settlement(amount, compensation_bps, reported_at=0):
+    """Same dict as PrmissionSDK.preview_settlement, plus dispute_window_end."""
+    user_share, protocol_fee, agent_refund = settlement_split(amount, compensation_bps)
+    return {"user_share": user_share, "user_share_usdc": raw_to_usdc(user_share), "protocol_fee": protocol_fee, "protocol_fee_usdc": raw_to_usdc(protocol_fee), "agent_refund": agent_refund, "agent_refund_usdc": raw_to_usdc(agent_refund), "dispute_window_end": reported_at + DISPUTE_WINDOW}
+
+
+def check_access(perm, agent, now):
+    """Same dict as PrmissionSDK.check_access for a permission dict at block timestamp `now`."""
+    permitted = (
+        perm["status"] == PermissionStatus.ACTIVE
+        and now < perm["valid_until"]
+        and perm["merchant"].lower() in (ZERO_ADDRESS, agent.lower())
+    )
+    return {"permitted": permitted, "compensation_bps": perm["compensation_bps"], "upfront_fee": perm["upfront_fee"], "valid_until": perm["valid_until"]}
+
+
+def can_deposit(perm, agent, amount, now):
+    """Whether depositEscrow(amount) passes the contract's checks (ERC-8004 gating aside)."""
+    if not check_access(perm, agent, now)["permitted"] or amount == 0:
+        return False
+    return amount >= amount * (perm["compensation_bps"] + PROTOCOL_FEE_BPS) // BPS_DENOMINATOR
+
+
+def can_grant(data_category, purpose, compensation_bps, validity_period):
+    """Whether grantPermission() with these arguments passes the contract's checks."""
+    return bool(data_category) and bool(purpose) and validity_period > 0 and compensation_bps <= MAX_COMPENSATION_BPS
+
+
+def capped_outcome(amount, outcome_value):
+    """outcomeValue as stored by reportOutcome()."""
+    return min(outcome_value, amount)
+
+
+def can_dispute(escrow, now):
+    return escrow["status"] == EscrowStatus.OUTCOME_REPORTED and now < escrow["reported_at"] + DISPUTE_WINDOW
+
+
+def can_settle(escrow, now):
+    return escrow["status"] == EscrowStatus.OUTCOME_REPORTED and now >= escrow["reported_at"] + DISPUTE_WINDOW
+
+
+def can_refund(escrow, perm, now, caller_is_owner=False):
+    """Mirrors the three refundEscrow() paths."""
+    revoked = perm["status"] == PermissionStatus.REVOKED
+    if revoked and escrow["status"] == EscrowStatus.FUNDED and now >= perm["revoked_at"] + REVOCATION_GRACE:
+        return True
+    if caller_is_owner and escrow["status"] == EscrowStatus.DISPUTED:
+        return True
+    return caller_is_owner and revoked and escrow["status"] == EscrowStatus.OUTCOME_REPORTED
+
+
+def _uint_array(np, values):
+    array = np.asarray(values)
+    if array.size == 0:
+        # An empty list comes out as float64; there is nothing to check
+        return array.astype(np.uint64)
+    if array.dtype.kind == "f" and not isinstance(values, np.ndarray):
+        # So does a list mixing ints below 2**63 with ints in [2**63, 2**64); keep those exact
+        array = np.asarray(values, dtype=object)
+        if not all(isinstance(value, Integral) for value in array.flat):
+            raise TypeError("expected an integer array")
+    if array.dtype.kind not in "iuO":
+        raise TypeError("expected an integer array")
+    if array.size and (array < 0).any():
+        raise ValueError("values must be non-negative")
+    if array.dtype.kind == "O" and (array > UINT256_MAX).any():
+        raise ValueError("values out of uint256 range")
+    return array
+
+
+def _overflows(products):
+    # uint64 arrays were only chosen where every product fits; Python ints can pass 2**256
+    return products.dtype.kind == "O" and bool((products > UINT256_MAX).any())
+
+
+def _exact_dtype(np, amounts, bps):
+    # uint64 is exact while amount * bps fits in 64 bits; beyond that use Python ints
+    top_amount = int(amounts.max()) if amounts.size else 0
+    top_bps = max(int(bps.max()) if bps.size else 0, PROTOCOL_FEE_BPS)
+    return np.uint64 if top_amount * top_bps < 2**64 else object
+
+
+def settlement_split_batch(amounts, compensation_bps, outcome_values=None):
+    """
+    Vectorized settlement_split over numpy arrays (compensation_bps may be a scalar).
+    Returns a dict of user_share, protocol_fee and agent_refund arrays, plus
+    outcome_value (capped at the amount) when outcome_values is given.
+    """
+    import numpy as np
+    amounts = _uint_array(np, amounts)
+    bps = _uint_array(np, np.broadcast_to(compensation_bps, amounts.shape))
+    dtype = _exact_dtype(np, amounts, bps)
+    amounts, bps = amounts.astype(dtype), bps.astype(dtype)
+    user_share = amounts * bps // BPS_DENOMINATOR
+    protocol_fee = amounts * PROTOCOL_FEE_BPS // BPS_DENOMINATOR
+    if _overflows(amounts * np.maximum(bps, PROTOCOL_FEE_BPS)) or (user_share + protocol_fee > amounts).any():
+        raise ArithmeticError("settlement overflows/underflows for some rows (Solidity panic 0x11)")
+    result = {"user_share": user_share, "protocol_fee": protocol_fee, "agent_refund": amounts - user_share - protocol_fee}
+    if outcome_values is not None:
+        outcomes = _uint_array(np, outcome_values)
+        result["outcome_value"] = np.where(outcomes > amounts, amounts, outcomes).astype(dtype)
+    return result
+
+
+def dispute_split_batch(amounts, user_bps):
+    """Vectorized dispute_split over numpy arrays (user_bps may be a scalar)."""
+    import numpy as np
+    amounts = _uint_array(np, amounts)
+    bps = _uint_array(np, np.broadcast_to(user_bps, amounts.shape))
+    if bps.size and (bps > BPS_DENOMINATOR).any():
+        raise ValueError("userBps exceeds 100%")
+    dtype = _exact_dtype(np, amounts, bps)
+    amounts, bps = amounts.astype(dtype), bps.astype(dtype)
+    if _overflows(amounts * PROTOCOL_FEE_BPS):
+        raise ArithmeticError("dispute split overflows for some rows (Solidity panic 0x11)")
+    protocol_fee = amounts * PROTOCOL_FEE_BPS // BPS_DENOMINATOR
+    distributable = amounts - protocol_fee
+    if _overflows(distributable * bps):
+        raise ArithmeticError("dispute split overflows for some rows (Solidity panic 0x11)")
+    user_share = distributable * bps // BPS_DENOMINATOR
+    return {"user_share": user_share, "protocol_fee": protocol_fee, "agent_refund": distributable - user_share}
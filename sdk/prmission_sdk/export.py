@@ -0,0 +1,232 @@
+import csv
+import datetime
+import decimal
+import gzip
+import logging
+import os
+import re
+import sqlite3
+from eth_utils import event_abi_to_log_topic
+from web3 import Web3
+from .constants import PRMISSION_V2_ADDRESS, PRMISSION_V2_ABI
+from .indexer import get_blocks, page_logs, _sql_int
+
+logger = logging.getLogger(__name__)
+
+EXPORTED_EVENTS = ["PermissionGranted", "EscrowDeposited", "SettlementCompleted", "DisputeResolved"]
+
+_LOG_COLUMNS = ["block_number", "timestamp", "date", "tx_hash", "log_index"]
+TABLES = {
+    "permissions": _LOG_COLUMNS + ["permission_id", "user", "merchant", "data_category", "purpose", "compensation_bps", "upfront_fee", "valid_until"],
+    "escrows": _LOG_COLUMNS + ["escrow_id", "permission_id", "agent", "agent_id", "amount", "merchant", "data_category"],
+    "settlements": _LOG_COLUMNS + ["event", "escrow_id", "permission_id", "agent", "merchant", "data_category", "amount", "user_share", "protocol_fee", "agent_refund"],
+}
+# Parquet column types; uint256 fields that can exceed int64 (agentId, validUntil) are written as text
+TEXT_COLUMNS = {"date", "tx_hash", "user", "merchant", "data_category", "purpose", "agent", "event", "agent_id", "valid_until"}
+# USDC amounts: uint256 on-chain, written as decimal128(38, 0) so values past int64 survive
+AMOUNT_COLUMNS = {"amount", "upfront_fee", "user_share", "protocol_fee", "agent_refund"}
+DECIMAL128_MAX = 10**38 - 1
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+CREATE TABLE IF NOT EXISTS permissions (id INTEGER PRIMARY KEY, merchant TEXT, data_category TEXT);
+-- amount is untyped so one past 64 bits stays exact text (see _sql_int) rather than a REAL
+CREATE TABLE IF NOT EXISTS escrows (id INTEGER PRIMARY KEY, permission_id INTEGER, agent TEXT, amount);
+"""
+
+
+def _write_csv(path, columns, rows):
+    with gzip.open(path, "wt", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+
+def _parquet_array(pa, path, column, values):
+    if column in AMOUNT_COLUMNS:
+        # The escrow join keeps amounts past int64 as text, hence int()
+        amounts = [None if v is None else int(v) for v in values]
+        if all(v is None or v <= DECIMAL128_MAX for v in amounts):
+            return pa.array([None if v is None else decimal.Decimal(v) for v in amounts], pa.decimal128(38, 0))
+        logger.warning("%s exceeds decimal128 in %s, written as text", column, path, extra={"event": "export_text_fallback", "column": column})
+    if column in TEXT_COLUMNS or column in AMOUNT_COLUMNS:
+        return pa.array([None if v is None else str(v) for v in values], pa.string())
+    return pa.array(values, pa.int64())
+
+
+def _write_parquet(path, columns, rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrays = [_parquet_array(pa, path, column, [r[i] for r in rows]) for i, column in enumerate(columns)]
+    pq.write_table(pa.Table.from_arrays(arrays, names=columns), path, compression="zstd")
+
+
+FORMATS = {"csv": (".csv.gz", _write_csv), "parquet": (".parquet", _write_parquet)}
+
+
+class EventExporter:
+    """
+    Streams PrmissionV2 history into numbered chunk files for analytics:
+    permissions-000001.csv.gz (PermissionGranted), escrows-... (EscrowDeposited)
+    and settlements-... (SettlementCompleted and DisputeResolved, with
+    userShare / protocolFee / agentRefund). Every row carries its block
+    timestamp and UTC date; escrow and settlement rows also carry the
+    permission's merchant and data_category, so fees can be grouped by
+    category, merchant and day straight from the files.
+
+    Logs are paged like EventIndexer.sync() and rows are buffered up to
+    chunk_rows per table, so memory stays bounded over the full history.
+    The join lookup and the last exported block live in export_state.sqlite
+    in out_dir, and advance only once the rows up to that block are on disk:
+    export() after an interruption resumes without gaps or duplicate rows.
+    format="parquet" needs pyarrow; USDC amounts are decimal128(38, 0)
+    columns, falling back to text for a chunk holding a larger value.
+    """
+
+    def __init__(self, w3, out_dir, contract_address=PRMISSION_V2_ADDRESS, start_block=0, confirmations=2, format="csv", chunk_rows=100_000, initial_range=2_000, min_range=1, max_range=50_000):
+        if format not in FORMATS:
+            raise ValueError(f"format must be one of {sorted(FORMATS)}")
+        self.w3 = w3
+        self.contract = w3.eth.contract(address=Web3.to_checksum_address(contract_address), abi=PRMISSION_V2_ABI)
+        self.out_dir = out_dir
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.extension, self._write = FORMATS[format]
+        self.chunk_rows = chunk_rows
+        self.block_range = initial_range
+        self.min_range = min_range
+        self.max_range = max_range
+        os.makedirs(out_dir, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(out_dir, "export_state.sqlite"))
+        self.db.executescript(STATE_SCHEMA)
+        self.events = {}
+        for name in EXPORTED_EVENTS:
+            event = self.contract.events[name]()
+            self.events[event_abi_to_log_topic(event.abi)] = event
+        self._buffers = {table: [] for table in TABLES}
+        self._discard_partial_chunks()
+
+    # ─── Checkpoints ────────────────────────────────────────────────────
+
+    def _meta(self, key, default):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @property
+    def last_block(self):
+        return self._meta("last_block", self.start_block - 1)
+
+    def _chunk_path(self, table, number):
+        return os.path.join(self.out_dir, f"{table}-{number:06d}{self.extension}")
+
+    def _discard_partial_chunks(self):
+        # Chunks written after the last checkpoint hold rows that will be exported again
+        pattern = re.compile(r"^(\w+)-(\d{6})" + re.escape(self.extension) + r"(\.tmp)?$")
+        for filename in os.listdir(self.out_dir):
+            match = pattern.match(filename)
+            if match and match.group(1) in TABLES and (match.group(3) or int(match.group(2)) > self._meta(f"{match.group(1)}_chunks", 0)):
+                os.remove(os.path.join(self.out_dir, filename))
+
+    def _flush(self, block_number):
+        """Write buffered rows as the next chunk of each table, then checkpoint block_number."""
+        chunks = {}
+        for table, rows in self._buffers.items():
+            if not rows:
+                continue
+            number = self._meta(f"{table}_chunks", 0) + 1
+            path = self._chunk_path(table, number)
+            self._write(path + ".tmp", TABLES[table], rows)
+            os.replace(path + ".tmp", path)
+            chunks[table] = number
+        with self.db:
+            for table, number in chunks.items():
+                self._set_meta(f"{table}_chunks", number)
+            self._set_meta("last_block", block_number)
+        for table in chunks:
+            self._buffers[table] = []
+        if chunks:
+            logger.info("Exported through block %d: %s", block_number, ", ".join(f"{t} #{n}" for t, n in chunks.items()), extra={"event": "export_chunk", "block": block_number})
+
+    # ─── Paging ─────────────────────────────────────────────────────────
+
+    def _get_logs(self, from_block, to_block):
+        return self.w3.eth.get_logs({
+            "address": self.contract.address, "fromBlock": from_block, "toBlock": to_block,
+            "topics": [["0x" + topic.hex() for topic in self.events]],
+        })
+
+    def _timestamps(self, block_numbers):
+        return {n: block["timestamp"] for n, block in get_blocks(self.w3, block_numbers).items()}
+
+    def pages(self, from_block, to_block):
+        """
+        Yield (last_block, rows) for each page of logs in from_block..to_block,
+        rows being (table, row) pairs in chain order. Permissions and escrows
+        seen are added to the join lookup, uncommitted until the next flush.
+        """
+        for _, end, logs in page_logs(self._get_logs, from_block, to_block, self):
+            timestamps = self._timestamps({log["blockNumber"] for log in logs}) if logs else {}
+            rows = []
+            for log in logs:
+                event = self.events.get(bytes(log["topics"][0]))
+                if event is not None:
+                    decoded = event.process_log(log)
+                    rows.append(self._row(decoded["event"], dict(decoded["args"]), log, timestamps[log["blockNumber"]]))
+            yield end, rows
+
+    def _row(self, name, args, log, timestamp):
+        date = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).date().isoformat()
+        prefix = [log["blockNumber"], timestamp, date, "0x" + log["transactionHash"].hex().removeprefix("0x"), log["logIndex"]]
+        if name == "PermissionGranted":
+            self.db.execute("INSERT OR REPLACE INTO permissions VALUES (?, ?, ?)", (args["permissionId"], args["merchant"], args["dataCategory"]))
+            return "permissions", prefix + [
+                args["permissionId"], args["user"], args["merchant"], args["dataCategory"], args["purpose"],
+                args["compensationBps"], args["upfrontFee"], args["validUntil"],
+            ]
+        if name == "EscrowDeposited":
+            self.db.execute("INSERT OR REPLACE INTO escrows VALUES (?, ?, ?, ?)", (args["escrowId"], args["permissionId"], args["agent"], _sql_int(args["amount"])))
+            merchant, category = self._permission(args["permissionId"])
+            return "escrows", prefix + [args["escrowId"], args["permissionId"], args["agent"], args["agentId"], args["amount"], merchant, category]
+        escrow = self.db.execute("SELECT permission_id, agent, amount FROM escrows WHERE id = ?", (args["escrowId"],)).fetchone()
+        permission_id, agent, amount = escrow if escrow else (None, None, None)
+        amount = int(amount) if amount is not None else None
+        merchant, category = self._permission(permission_id)
+        return "settlements", prefix + [
+            name, args["escrowId"], permission_id, agent, merchant, category, amount,
+            args["userShare"], args["protocolFee"], args["agentRefund"],
+        ]
+
+    def _permission(self, permission_id):
+        # Permissions granted before start_block have no merchant or category
+        row = self.db.execute("SELECT merchant, data_category FROM permissions WHERE id = ?", (permission_id,)).fetchone() if permission_id is not None else None
+        return row if row else (None, None)
+
+    # ─── Export ─────────────────────────────────────────────────────────
+
+    def export(self, to_block=None):
+        """Export up to to_block (default: head minus confirmations). Returns rows written per table."""
+        head = to_block if to_block is not None else self.w3.eth.block_number - self.confirmations
+        written = {table: 0 for table in TABLES}
+        if head <= self.last_block:
+            return written
+        try:
+            for end, rows in self.pages(self.last_block + 1, head):
+                for table, row in rows:
+                    self._buffers[table].append(row)
+                    written[table] += 1
+                if any(len(buffer) >= self.chunk_rows for buffer in self._buffers.values()):
+                    self._flush(end)
+            self._flush(head)
+        except BaseException:
+            # Back to the last checkpoint, so the next export() starts from a clean state
+            self.db.rollback()
+            self._buffers = {table: [] for table in TABLES}
+            raise
+        return written
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import threading
+import time
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+GWEI = 10**9
+MIN_PRIORITY_FEE = GWEI // 1000
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+
+def suggest_fees(history, base_fee_multiplier=2, min_priority_fee=MIN_PRIORITY_FEE):
+    """
+    EIP-1559 fields from an eth_feeHistory result: the median reward of the
+    sampled blocks as tip and room for the next block's base fee to grow
+    base_fee_multiplier-fold. None if the node returned no history.
+    """
+    base_fees = history["baseFeePerGas"]
+    if not base_fees:
+        return None
+    rewards = sorted(r[0] for r in history.get("reward") or [] if r)
+    priority = max(rewards[len(rewards) // 2] if rewards else 0, min_priority_fee)
+    # The last entry is the base fee of the block after the newest one sampled
+    return {"maxFeePerGas": base_fees[-1] * base_fee_multiplier + priority, "maxPriorityFeePerGas": priority}
+
+
+def fallback_fees(gas_price, min_priority_fee=MIN_PRIORITY_FEE):
+    """Fees for nodes without eth_feeHistory: gas price plus 1 gwei headroom."""
+    return {"maxFeePerGas": gas_price + GWEI, "maxPriorityFeePerGas": min_priority_fee}
+
+
+class FeeOracle:
+    """
+    Serves EIP-1559 fee suggestions from memory, refreshed from eth_feeHistory
+    once they are older than max_age seconds (one Base block by default).
+    Call start() to refresh from a background thread instead, so
+    transactions never wait on it.
+    """
+
+    def __init__(self, w3, block_count=10, reward_percentile=50, base_fee_multiplier=2, min_priority_fee=MIN_PRIORITY_FEE, max_age=2.0, clock=time.monotonic):
+        self.w3 = w3
+        self.block_count = block_count
+        self.reward_percentile = reward_percentile
+        self.base_fee_multiplier = base_fee_multiplier
+        self.min_priority_fee = min_priority_fee
+        self.max_age = max_age
+        self.clock = clock
+        self._fees = None
+        self._updated = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _fresh(self):
+        if self._fees is not None and self.clock() - self._updated < self.max_age:
+            return self._fees
+        return None
+
+    def refresh(self):
+        try:
+            history = self.w3.eth.fee_history(self.block_count, "latest", [self.reward_percentile])
+            fees = suggest_fees(history, self.base_fee_multiplier, self.min_priority_fee)
+        except Exception as e:
+            logger.debug("eth_feeHistory unavailable, using eth_gasPrice: %s", e)
+            fees = None
+        if fees is None:
+            fees = fallback_fees(self.w3.eth.gas_price, self.min_priority_fee)
+        self._fees, self._updated = fees, self.clock()
+        return fees
+
+    def suggest(self):
+        fees = self._fresh()
+        if fees is not None:
+            return fees
+        # One thread refreshes; the others wait for its result
+        with self._refresh_lock:
+            return self._fresh() or self.refresh()
+
+    def start(self, interval=None):
+        if self._thread is not None:
+            return
+        interval = interval or self.max_age / 2
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.warning("Fee refresh failed: %s", e)
+
+        self.refresh()
+        self._thread = threading.Thread(target=loop, name="prmission-fees", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class AsyncFeeOracle:
+    """FeeOracle for AsyncWeb3; start() refreshes from a task on the running loop."""
+
+    def __init__(self, w3, block_count=10, reward_percentile=50, base_fee_multiplier=2, min_priority_fee=MIN_PRIORITY_FEE, max_age=2.0, clock=time.monotonic):
+        self.w3 = w3
+        self.block_count = block_count
+        self.reward_percentile = reward_percentile
+        self.base_fee_multiplier = base_fee_multiplier
+        self.min_priority_fee = min_priority_fee
+        self.max_age = max_age
+        self.clock = clock
+        self._fees = None
+        self._updated = None
+        self._refresh_lock = asyncio.Lock()
+        self._task = None
+
+    _fresh = FeeOracle._fresh
+
+    async def refresh(self):
+        try:
+            history = await self.w3.eth.fee_history(self.block_count, "latest", [self.reward_percentile])
+            fees = suggest_fees(history, self.base_fee_multiplier, self.min_priority_fee)
+        except Exception as e:
+            logger.debug("eth_feeHistory unavailable, using eth_gasPrice: %s", e)
+            fees = None
+        if fees is None:
+            fees = fallback_fees(await self.w3.eth.gas_price, self.min_priority_fee)
+        self._fees, self._updated = fees, self.clock()
+        return fees
+
+    async def suggest(self):
+        fees = self._fresh()
+        if fees is not None:
+            return fees
+        async with self._refresh_lock:
+            return self._fresh() or await self.refresh()
+
+    async def start(self, interval=None):
+        if self._task is not None:
+            return
+        interval = interval or self.max_age / 2
+
+        async def loop():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    logger.warning("Fee refresh failed: %s", e)
+
+        await self.refresh()
+        self._task = asyncio.get_running_loop().create_task(loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def _shape(value):
+    # What moves the gas cost of a call: 32-byte words of dynamic data, and
+    # zero vs. non-zero words (calldata pricing, fresh vs. cleared storage)
+    if isinstance(value, str) and len(value) == 42 and value.startswith("0x"):
+        return value.lower() == ZERO_ADDRESS
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, (bytes, bytearray)):
+        return ("bytes", (len(value) + 31) // 32)
+    if isinstance(value, int):
+        return value == 0
+    if isinstance(value, (list, tuple)):
+        return tuple(_shape(v) for v in value)
+    return type(value).__name__
+
+
+class GasEstimateCache:
+    """
+    eth_estimateGas results memoized per (contract, function, argument
+    shape), so e.g. every settle() or a reportOutcome() with similarly sized
+    strings reuses one estimate for ttl seconds. A profile is dropped when
+    one of its transactions fails or runs out of gas, so the next send
+    re-estimates (which also surfaces reverts before broadcasting again).
+    ttl=0 disables the cache.
+    """
+
+    def __init__(self, ttl=300.0, maxsize=1024):
+        self.estimates = TTLCache(maxsize if ttl else 0, ttl)
+
+    @staticmethod
+    def profile(tx_func):
+        return (tx_func.address, tx_func.fn_name, tuple(_shape(arg) for arg in tx_func.args))
+
+    def get(self, profile):
+        return self.estimates.get(profile)
+
+    def store(self, profile, gas_estimate):
+        self.estimates.set(profile, gas_estimate)
+
+    def on_receipt(self, profile, receipt):
+        if profile is not None and receipt["status"] != 1:
+            self.estimates.invalidate(profile)
+
+    def stats(self):
+        return self.estimates.stats()
@@ -0,0 +1,326 @@
+import json
+import sqlite3
+import threading
+import time
+from eth_utils import event_abi_to_log_topic
+from web3 import Web3
+from web3.exceptions import BlockNotFound
+from web3.providers import JSONBaseProvider
+from .constants import PRMISSION_V2_ADDRESS, PRMISSION_V2_ABI, READ_BATCH_SIZE, DISPUTE_WINDOW, PermissionStatus, EscrowStatus
+from .decode import PERMISSION_STATUS_NAMES, ESCROW_STATUS_NAMES, chunked
+
+INDEXED_EVENTS = [
+    "PermissionGranted", "PermissionRevoked", "PermissionExpired",
+    "EscrowDeposited", "OutcomeReported", "DisputeFiled", "DisputeResolved",
+    "SettlementCompleted", "EscrowRefunded",
+]
+# Events whose rows record the block timestamp (created_at)
+TIMESTAMPED_EVENTS = ("PermissionGranted", "EscrowDeposited")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+CREATE TABLE IF NOT EXISTS blocks (number INTEGER PRIMARY KEY, hash TEXT NOT NULL, timestamp INTEGER);
+CREATE TABLE IF NOT EXISTS events (
+    block_number INTEGER, log_index INTEGER, timestamp INTEGER, tx_hash TEXT, event TEXT, args TEXT,
+    permission_id INTEGER, escrow_id INTEGER, PRIMARY KEY (block_number, log_index)
+);
+CREATE INDEX IF NOT EXISTS events_permission ON events (permission_id);
+CREATE INDEX IF NOT EXISTS events_escrow ON events (escrow_id);
+-- uint256 columns are untyped: a value past 64 bits is stored as text (see _sql_int),
+-- which an INTEGER column would turn into a lossy REAL
+CREATE TABLE IF NOT EXISTS permissions (
+    id INTEGER PRIMARY KEY, user TEXT, merchant TEXT, data_category TEXT, purpose TEXT,
+    compensation_bps INTEGER, upfront_fee, valid_until, status INTEGER,
+    created_at INTEGER, revoked_at INTEGER, updated_block INTEGER
+);
+CREATE INDEX IF NOT EXISTS permissions_user ON permissions (user);
+CREATE TABLE IF NOT EXISTS escrows (
+    id INTEGER PRIMARY KEY, permission_id INTEGER, agent TEXT, agent_id, amount,
+    outcome_value, outcome_type TEXT, reported_at INTEGER, status INTEGER, created_at INTEGER,
+    user_share, protocol_fee, agent_refund, updated_block INTEGER
+);
+CREATE INDEX IF NOT EXISTS escrows_status ON escrows (status, reported_at);
+CREATE INDEX IF NOT EXISTS escrows_permission ON escrows (permission_id);
+"""
+
+
+def page_logs(get_logs, start, end, pager):
+    """
+    Yield (from_block, to_block, logs) covering start..end. Ranges are
+    pager.block_range blocks, halved (down to pager.min_range) when the node
+    rejects a query and doubled (up to pager.max_range) while pages come
+    back small, so the pager remembers a good size across calls.
+    """
+    while start <= end:
+        to_block = min(start + pager.block_range - 1, end)
+        try:
+            logs = get_logs(start, to_block)
+        except Exception:
+            if pager.block_range <= pager.min_range:
+                raise
+            pager.block_range = max(pager.min_range, pager.block_range // 2)
+            continue
+        yield start, to_block, logs
+        start = to_block + 1
+        if len(logs) < 1_000:
+            pager.block_range = min(pager.max_range, pager.block_range * 2)
+
+
+def get_blocks(w3, block_numbers):
+    """Blocks by number, fetched READ_BATCH_SIZE per JSON-RPC batch when the provider supports it."""
+    numbers = sorted(block_numbers)
+    if not isinstance(w3.provider, JSONBaseProvider):
+        return {n: w3.eth.get_block(n) for n in numbers}
+    blocks = {}
+    for chunk in chunked(numbers, READ_BATCH_SIZE):
+        with w3.batch_requests() as batch:
+            for n in chunk:
+                batch.add(w3.eth.get_block(n))
+            blocks.update(zip(chunk, batch.execute()))
+    return blocks
+
+
+def _sql_int(value):
+    # SQLite integers are 64-bit; anything larger (e.g. a huge validUntil) is kept as text
+    return value if value < 2**63 else str(value)
+
+
+class EventIndexer:
+    """
+    Materializes PrmissionV2 permissions and escrows into a local SQLite
+    database from contract logs.
+
+    sync() pulls eth_getLogs in block ranges that shrink when the node
+    rejects a query and grow again while ranges come back small, applies
+    each range in one transaction and checkpoints the last indexed block.
+    Hashes of recent blocks are kept so a reorg is detected on the next
+    sync and the affected rows are rebuilt from the surviving events.
+    Callables in `listeners` receive (event_name, args) for every new event,
+    e.g. sdk.cache.apply_event.
+
+    One indexer may be shared between threads, e.g. run() in a worker thread
+    while others query it: database access is serialized by a lock, held
+    for each applied range but not while waiting on the node.
+    """
+
+    def __init__(self, w3, db_path="prmission_index.sqlite", contract_address=PRMISSION_V2_ADDRESS, start_block=0, confirmations=2, reorg_depth=128, initial_range=2_000, min_range=1, max_range=50_000):
+        self.w3 = w3
+        self.contract = w3.eth.contract(address=Web3.to_checksum_address(contract_address), abi=PRMISSION_V2_ABI)
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.reorg_depth = reorg_depth
+        self.block_range = initial_range
+        self.min_range = min_range
+        self.max_range = max_range
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self.listeners = []
+        self.events = {}
+        self._timestamped = set()
+        for name in INDEXED_EVENTS:
+            event = self.contract.events[name]()
+            topic = event_abi_to_log_topic(event.abi)
+            self.events[topic] = event
+            if name in TIMESTAMPED_EVENTS:
+                self._timestamped.add(topic)
+
+    # ─── Checkpoints ────────────────────────────────────────────────────
+
+    def _rows(self, query, params=()):
+        with self._lock:
+            return self.db.execute(query, params).fetchall()
+
+    @property
+    def last_block(self):
+        rows = self._rows("SELECT value FROM meta WHERE key = 'last_block'")
+        return rows[0][0] if rows else self.start_block - 1
+
+    def _set_last_block(self, number):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_block', ?)", (number,))
+
+    def _fetch_blocks(self, numbers):
+        """Hashes and timestamps of the blocks not stored yet, fetched in batches outside the lock."""
+        with self._lock:
+            stored = {r["number"] for r in self.db.execute("SELECT number FROM blocks WHERE timestamp IS NOT NULL AND number BETWEEN ? AND ?", (min(numbers), max(numbers)))}
+        return [(n, block["hash"].hex(), block["timestamp"]) for n, block in get_blocks(self.w3, set(numbers) - stored).items()]
+
+    def _timestamp(self, number):
+        row = self.db.execute("SELECT timestamp FROM blocks WHERE number = ?", (number,)).fetchone()
+        return row["timestamp"] if row else None
+
+    # ─── Reorgs ─────────────────────────────────────────────────────────
+
+    def _find_fork_point(self):
+        """Newest stored block still on the canonical chain, or None when nothing diverged."""
+        rows = self._rows("SELECT number, hash FROM blocks ORDER BY number DESC")
+        for i, row in enumerate(rows):
+            try:
+                canonical = self.w3.eth.get_block(row["number"])["hash"].hex()
+            except BlockNotFound:
+                continue
+            if canonical == row["hash"]:
+                return None if i == 0 else row["number"]
+        return self.start_block - 1 if rows else None
+
+    def rollback(self, block_number):
+        """Discard everything indexed after block_number and rebuild the rows it touched."""
+        with self._lock, self.db:
+            touched = self.db.execute("SELECT DISTINCT permission_id, escrow_id FROM events WHERE block_number > ?", (block_number,)).fetchall()
+            self.db.execute("DELETE FROM events WHERE block_number > ?", (block_number,))
+            self.db.execute("DELETE FROM blocks WHERE number > ?", (block_number,))
+            permission_ids = {r["permission_id"] for r in touched if r["permission_id"] is not None}
+            escrow_ids = {r["escrow_id"] for r in touched if r["escrow_id"] is not None}
+            for perm_id in permission_ids:
+                self.db.execute("DELETE FROM permissions WHERE id = ?", (perm_id,))
+            for escrow_id in escrow_ids:
+                self.db.execute("DELETE FROM escrows WHERE id = ?", (escrow_id,))
+            # Escrow events are keyed by escrow, permission events by permission
+            replay = self.db.execute(
+                f"SELECT * FROM events WHERE (escrow_id IS NULL AND permission_id IN ({','.join('?' * len(permission_ids))})) "
+                f"OR escrow_id IN ({','.join('?' * len(escrow_ids))}) ORDER BY block_number, log_index",
+                (*permission_ids, *escrow_ids),
+            ).fetchall()
+            for row in replay:
+                self._apply(row["event"], json.loads(row["args"]), row["block_number"], row["timestamp"])
+            self._set_last_block(block_number)
+
+    # ─── Sync ───────────────────────────────────────────────────────────
+
+    def _get_logs(self, from_block, to_block):
+        return self.w3.eth.get_logs({
+            "address": self.contract.address, "fromBlock": from_block, "toBlock": to_block,
+            "topics": [["0x" + topic.hex() for topic in self.events]],
+        })
+
+    def sync(self, to_block=None):
+        """Index up to to_block (default: head minus confirmations). Returns the number of events applied."""
+        fork = self._find_fork_point()
+        if fork is not None:
+            self.rollback(fork)
+        head = to_block if to_block is not None else self.w3.eth.block_number - self.confirmations
+        applied = 0
+        for _, end, logs in page_logs(self._get_logs, self.last_block + 1, head, self):
+            # Timestamps for the whole page, plus the checkpoint block's hash for reorg detection
+            blocks = self._fetch_blocks({end} | {log["blockNumber"] for log in logs if bytes(log["topics"][0]) in self._timestamped})
+            with self._lock, self.db:
+                self.db.executemany("INSERT OR REPLACE INTO blocks (number, hash, timestamp) VALUES (?, ?, ?)", blocks)
+                for log in logs:
+                    applied += self._ingest(log)
+                self._set_last_block(end)
+                self.db.execute("DELETE FROM blocks WHERE number < ?", (end - self.reorg_depth,))
+        return applied
+
+    def run(self, poll_interval=2.0, stop=None):
+        """Keep the index at the chain head until stop (a threading.Event) is set."""
+        while stop is None or not stop.is_set():
+            self.sync()
+            time.sleep(poll_interval)
+
+    def _ingest(self, log):
+        event = self.events.get(bytes(log["topics"][0]))
+        if event is None:
+            return 0
+        decoded = event.process_log(log)
+        name, args = decoded["event"], dict(decoded["args"])
+        block_number = log["blockNumber"]
+        self.db.execute("INSERT OR IGNORE INTO blocks (number, hash) VALUES (?, ?)", (block_number, log["blockHash"].hex()))
+        timestamp = self._timestamp(block_number) if name in TIMESTAMPED_EVENTS else None
+        inserted = self.db.execute(
+            "INSERT OR IGNORE INTO events (block_number, log_index, timestamp, tx_hash, event, args, permission_id, escrow_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (block_number, log["logIndex"], timestamp, log["transactionHash"].hex(), name, json.dumps(args), args.get("permissionId"), args.get("escrowId")),
+        ).rowcount
+        if inserted:
+            self._apply(name, args, block_number, timestamp)
+            for listener in self.listeners:
+                listener(name, args)
+        return inserted
+
+    def _apply(self, name, args, block_number, timestamp):
+        db = self.db
+        if name == "PermissionGranted":
+            db.execute(
+                "INSERT OR REPLACE INTO permissions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?)",
+                (args["permissionId"], args["user"], args["merchant"], args["dataCategory"], args["purpose"],
+                 args["compensationBps"], _sql_int(args["upfrontFee"]), _sql_int(args["validUntil"]),
+                 PermissionStatus.ACTIVE, timestamp, block_number),
+            )
+        elif name == "PermissionRevoked":
+            db.execute("UPDATE permissions SET status = ?, revoked_at = ?, updated_block = ? WHERE id = ?", (PermissionStatus.REVOKED, args["revokedAt"], block_number, args["permissionId"]))
+        elif name == "PermissionExpired":
+            db.execute("UPDATE permissions SET status = ?, updated_block = ? WHERE id = ?", (PermissionStatus.EXPIRED, block_number, args["permissionId"]))
+        elif name == "EscrowDeposited":
+            db.execute(
+                "INSERT OR REPLACE INTO escrows VALUES (?, ?, ?, ?, ?, 0, '', 0, ?, ?, NULL, NULL, NULL, ?)",
+                (args["escrowId"], args["permissionId"], args["agent"], _sql_int(args["agentId"]), _sql_int(args["amount"]), EscrowStatus.FUNDED, timestamp, block_number),
+            )
+        elif name == "OutcomeReported":
+            db.execute(
+                "UPDATE escrows SET outcome_value = ?, outcome_type = ?, reported_at = ?, status = ?, updated_block = ? WHERE id = ?",
+                (_sql_int(args["outcomeValue"]), args["outcomeType"], args["disputeWindowEnd"] - DISPUTE_WINDOW, EscrowStatus.OUTCOME_REPORTED, block_number, args["escrowId"]),
+            )
+        elif name == "DisputeFiled":
+            db.execute("UPDATE escrows SET status = ?, updated_block = ? WHERE id = ?", (EscrowStatus.DISPUTED, block_number, args["escrowId"]))
+        elif name in ("SettlementCompleted", "DisputeResolved"):
+            db.execute(
+                "UPDATE escrows SET status = ?, user_share = ?, protocol_fee = ?, agent_refund = ?, updated_block = ? WHERE id = ?",
+                (EscrowStatus.SETTLED, _sql_int(args["userShare"]), _sql_int(args["protocolFee"]), _sql_int(args["agentRefund"]), block_number, args["escrowId"]),
+            )
+        elif name == "EscrowRefunded":
+            db.execute("UPDATE escrows SET status = ?, updated_block = ? WHERE id = ?", (EscrowStatus.REFUNDED, block_number, args["escrowId"]))
+
+    # ─── Queries ────────────────────────────────────────────────────────
+
+    def _permission(self, row):
+        p = dict(row)
+        p["status_name"] = PERMISSION_STATUS_NAMES[p["status"]]
+        return p
+
+    def _escrow(self, row):
+        e = dict(row)
+        e["status_name"] = ESCROW_STATUS_NAMES[e["status"]]
+        return e
+
+    def get_permission(self, permission_id):
+        rows = self._rows("SELECT * FROM permissions WHERE id = ?", (permission_id,))
+        return self._permission(rows[0]) if rows else None
+
+    def get_escrow(self, escrow_id):
+        rows = self._rows("SELECT * FROM escrows WHERE id = ?", (escrow_id,))
+        return self._escrow(rows[0]) if rows else None
+
+    def permissions(self, user=None, status=None):
+        query, params = "SELECT * FROM permissions WHERE 1=1", []
+        if user is not None:
+            query += " AND user = ?"
+            params.append(Web3.to_checksum_address(user))
+        if status is not None:
+            query += " AND status = ?"
+            params.append(status)
+        return [self._permission(r) for r in self._rows(query + " ORDER BY id", params)]
+
+    def escrows(self, status=None, permission_id=None, agent=None):
+        query, params = "SELECT * FROM escrows WHERE 1=1", []
+        if status is not None:
+            query += " AND status = ?"
+            params.append(status)
+        if permission_id is not None:
+            query += " AND permission_id = ?"
+            params.append(permission_id)
+        if agent is not None:
+            query += " AND agent = ?"
+            params.append(Web3.to_checksum_address(agent))
+        return [self._escrow(r) for r in self._rows(query + " ORDER BY id", params)]
+
+    def settleable_escrows(self, now=None, limit=None):
+        """OUTCOME_REPORTED escrows whose dispute window has closed, oldest first."""
+        now = int(time.time()) if now is None else now
+        query = "SELECT * FROM escrows WHERE status = ? AND reported_at + ? <= ? ORDER BY reported_at"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        return [self._escrow(r) for r in self._rows(query, (EscrowStatus.OUTCOME_REPORTED, DISPUTE_WINDOW, now))]
+
+    def close(self):
+        with self._lock:
+            self.db.close()
@@ -0,0 +1,187 @@
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class MetricsRegistry:
+    """
+    In-process counters and observations for the SDK, keyed by name and labels.
+
+    Every inc()/observe() is also passed to each callable in `listeners` as
+    (kind, name, value, labels), so metrics can be forwarded to StatsD,
+    OpenTelemetry, etc. Observations on names ending in _seconds get
+    Prometheus histogram buckets; others are exported as summaries
+    (count/sum). MetricsRegistry(enabled=False) records nothing.
+    """
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.listeners = []
+        self._counters = {}
+        self._observations = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        for listener in self.listeners:
+            listener("counter", name, value, labels)
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            obs = self._observations.get(key)
+            if obs is None:
+                obs = self._observations[key] = {"count": 0, "sum": 0, "min": value, "max": value, "buckets": [0] * len(self.buckets) if name.endswith("_seconds") else None}
+            obs["count"] += 1
+            obs["sum"] += value
+            obs["min"] = min(obs["min"], value)
+            obs["max"] = max(obs["max"], value)
+            if obs["buckets"] is not None:
+                for i, bound in enumerate(self.buckets):
+                    if value <= bound:
+                        obs["buckets"][i] += 1
+        for listener in self.listeners:
+            listener("observation", name, value, labels)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the wall time of the with-block under `name`, even if it raises."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter(self, name, **labels):
+        return self._counters.get((name, _labels(labels)), 0)
+
+    def summary(self, name, **labels):
+        """count/sum/min/max/mean of an observed metric, or None if never observed."""
+        obs = self._observations.get((name, _labels(labels)))
+        if obs is None:
+            return None
+        return {"count": obs["count"], "sum": obs["sum"], "min": obs["min"], "max": obs["max"], "mean": obs["sum"] / obs["count"]}
+
+    def snapshot(self):
+        with self._lock:
+            counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._counters.items())]
+            observations = [
+                {"name": n, "labels": dict(l), "count": o["count"], "sum": o["sum"], "min": o["min"], "max": o["max"], "mean": o["sum"] / o["count"]}
+                for (n, l), o in sorted(self._observations.items())
+            ]
+        return {"counters": counters, "observations": observations}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._observations.clear()
+
+    def to_prometheus(self, prefix="prmission_"):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        typed = set()
+        with self._lock:
+            counters = sorted(self._counters.items())
+            observations = sorted((k, {**o, "buckets": list(o["buckets"]) if o["buckets"] else None}) for k, o in self._observations.items())
+        for (name, labels), value in counters:
+            metric = prefix + name
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+        for (name, labels), obs in observations:
+            metric = prefix + name
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} {'histogram' if obs['buckets'] is not None else 'summary'}")
+            if obs["buckets"] is not None:
+                for bound, count in zip(self.buckets, obs["buckets"]):
+                    lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {obs['count']}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {obs['sum']}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {obs['count']}")
+        return "\n".join(lines) + "\n"
+
+
+# Clients record here unless given their own registry
+DEFAULT_REGISTRY = MetricsRegistry()
+
+
+def serve_prometheus(registry, port=9464, host="0.0.0.0"):
+    """Expose registry.to_prometheus() at http://host:port/metrics from a daemon thread. Returns the server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="prmission-metrics", daemon=True).start()
+    return server
+
+
+def instrumented(func):
+    """Time an SDK method (sync or async) into self.metrics as sdk_call_seconds{method=<name>}."""
+    name = func.__name__
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(self, *args, **kwargs):
+            with self.metrics.timer("sdk_call_seconds", method=name):
+                return await func(self, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.metrics.timer("sdk_call_seconds", method=name):
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
+def record_receipt(metrics, pending, receipt):
+    """Confirmation latency, outcome and gas used vs. estimated for a mined transaction."""
+    metrics.observe("tx_confirmation_seconds", time.monotonic() - pending.sent_at, fn=pending.fn_name)
+    metrics.inc("tx_confirmed_total" if receipt["status"] == 1 else "tx_failed_total", fn=pending.fn_name)
+    metrics.observe("tx_gas_used", receipt["gasUsed"], fn=pending.fn_name)
+    if pending.gas_estimate:
+        # Stays below 1.0 when estimates are accurate; gas_multiplier only needs to cover the max
+        metrics.observe("tx_gas_used_ratio", receipt["gasUsed"] / pending.gas_estimate, fn=pending.fn_name)
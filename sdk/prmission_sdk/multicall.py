@@ -0,0 +1,20 @@
+from eth_utils.abi import get_abi_output_types
+from web3._utils.abi import map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+
+
+def encode_aggregate3(calls, allow_failure=True):
+    return [(call.address, allow_failure, call._encode_transaction_data()) for call in calls]
+
+
+def decode_aggregate3(codec, calls, returned):
+    """Decode aggregate3 results like ContractFunction.call() would; failed calls yield None."""
+    results = []
+    for call, (success, data) in zip(calls, returned):
+        if not success:
+            results.append(None)
+            continue
+        output_types = get_abi_output_types(call.abi)
+        values = map_abi_data(BASE_RETURN_NORMALIZERS, output_types, codec.decode(output_types, data))
+        results.append(values[0] if len(values) == 1 else list(values))
+    return results
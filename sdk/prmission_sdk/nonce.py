@@ -0,0 +1,100 @@
+import heapq
+import re
+import threading
+
+# The nonce was consumed (by us or another sender of this account): move past it
+NONCE_TOO_LOW_ERRORS = ("nonce too low", "nonce has already been used", "replacement transaction underpriced")
+# The node expects a lower nonce than ours: one of our earlier transactions never reached it
+NONCE_GAP_ERRORS = ("nonce too high",)
+# eth-tester names both numbers: "Invalid transaction nonce: Expected 11, but got 10"
+_NONCE_MISMATCH = re.compile(r"expected (\d+),? but got (\d+)")
+# The node already has this exact signed transaction, e.g. a retried send whose first reply was lost
+ALREADY_KNOWN_ERRORS = ("already known", "known transaction", "already imported")
+
+
+def _matches(exc, markers):
+    message = str(exc).lower()
+    return any(marker in message for marker in markers)
+
+
+def nonce_mismatch(exc):
+    """(expected, sent) when the error names both nonces, else None."""
+    match = _NONCE_MISMATCH.search(str(exc).lower())
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def is_nonce_error(exc):
+    mismatch = nonce_mismatch(exc)
+    if mismatch is not None:
+        return mismatch[1] < mismatch[0]
+    return _matches(exc, NONCE_TOO_LOW_ERRORS)
+
+
+def is_nonce_gap(exc):
+    mismatch = nonce_mismatch(exc)
+    if mismatch is not None:
+        return mismatch[1] > mismatch[0]
+    return _matches(exc, NONCE_GAP_ERRORS)
+
+
+def is_already_known(exc):
+    return _matches(exc, ALREADY_KNOWN_ERRORS)
+
+
+class NonceManager:
+    """
+    Hands out nonces for one sender from local state so several transactions
+    can be in flight at once. The chain is only consulted on first use and
+    after "nonce too low", and only ever moves the next nonce forward: a
+    lagging node never makes us re-use (and so replace) a nonce that is
+    already in flight. Nonces taken for sends that failed are release()d and
+    handed out again first, so they don't leave a gap.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next = None
+        self._released = []
+
+    @property
+    def needs_sync(self):
+        return self._next is None
+
+    def next(self, fetch=None):
+        with self._lock:
+            if self._released:
+                return heapq.heappop(self._released)
+            if self._next is None:
+                if fetch is None:
+                    raise RuntimeError("NonceManager is not synced")
+                self._next = fetch()
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def release(self, nonce):
+        """Give back a nonce whose transaction was never accepted by the node."""
+        with self._lock:
+            if self._next is None or nonce >= self._next:
+                return
+            if nonce == self._next - 1:
+                self._next = nonce
+                # Released nonces just below are now at the end of the range too
+                while self._released and max(self._released) == self._next - 1:
+                    self._released.remove(self._next - 1)
+                    heapq.heapify(self._released)
+                    self._next -= 1
+            elif nonce not in self._released:
+                heapq.heappush(self._released, nonce)
+
+    def resync(self, chain_nonce):
+        """Move forward to the chain's pending nonce; never back over nonces already handed out."""
+        with self._lock:
+            self._next = chain_nonce if self._next is None else max(self._next, chain_nonce)
+            self._released = [n for n in self._released if n >= chain_nonce]
+            heapq.heapify(self._released)
+
+    def reset(self):
+        with self._lock:
+            self._next = None
+            self._released = []
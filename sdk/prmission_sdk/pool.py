@@ -0,0 +1,454 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from urllib.parse import urlsplit
+from aiohttp import ClientTimeout
+from web3 import AsyncWeb3, Web3
+from web3.providers import JSONBaseProvider
+from web3.providers.async_base import AsyncJSONBaseProvider
+from .metrics import DEFAULT_REGISTRY
+from .nonce import is_already_known
+
+logger = logging.getLogger(__name__)
+
+HEDGED_METHODS = ("eth_call",)
+BROADCAST_METHODS = frozenset({"eth_sendRawTransaction"})
+HEDGE_BURST = 10
+# JSON-RPC errors that blame the endpoint rather than the request (rate
+# limited, behind the chain head, failing internally): another may answer
+ENDPOINT_ERROR_CODES = frozenset({-32005, -32603, 429})
+ENDPOINT_ERROR_MESSAGES = ("header not found", "unknown block", "rate limit", "too many requests", "limit exceeded", "internal error")
+
+
+def is_endpoint_error(response):
+    error = response.get("error") if isinstance(response, dict) else None
+    if not isinstance(error, dict):
+        return False
+    message = str(error.get("message", "")).lower()
+    # Reverts come back the same from every endpoint (some nodes use -32603 for them)
+    if "revert" in message or error.get("data"):
+        return False
+    return error.get("code") in ENDPOINT_ERROR_CODES or any(marker in message for marker in ENDPOINT_ERROR_MESSAGES)
+
+
+class EndpointError(Exception):
+    """An endpoint answered with an endpoint-health error; counted as a failure so the pool fails over."""
+
+    def __init__(self, response, error):
+        super().__init__(f"{error.get('code')}: {error.get('message')}")
+        self.response = response
+
+
+class Endpoint:
+    """Health and latency of one RPC URL in a pool."""
+
+    def __init__(self, url, provider):
+        self.url = url
+        self.provider = provider
+        # host:port only; paths often carry API keys
+        self.label = urlsplit(url).netloc or url
+        self.latency = None
+        self.in_flight = 0
+        # perf_counter() start of each request in flight
+        self.started = []
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    def score(self, now):
+        # Endpoints that just failed go last; otherwise the expected wait if sent
+        # here now, with untried endpoints first so they get measured. A request
+        # still running has taken at least its age, so a hung endpoint (measured
+        # or not) sinks instead of taking everything
+        latency = self.latency
+        if self.started:
+            latency = max(latency or 0.0, now - min(self.started))
+        if latency is None:
+            return (self.failures > 0, 0.0)
+        return (self.failures > 0, latency * (self.in_flight + 1))
+
+
+class _EndpointPool:
+    """Endpoint ranking, latency tracking and ejection shared by RPCPool and AsyncRPCPool."""
+
+    def _setup(self, endpoints, hedge_after, hedge_methods, hedge_budget, max_failures, backoff, max_backoff, latency_alpha, metrics, clock):
+        if not endpoints:
+            raise ValueError("RPC pool needs at least one URL")
+        self.endpoints = endpoints
+        self.hedge_after = hedge_after
+        self.hedge_methods = frozenset(hedge_methods)
+        self.hedge_budget = hedge_budget
+        self._hedge_tokens = HEDGE_BURST
+        self.max_failures = max_failures
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.latency_alpha = latency_alpha
+        self.metrics = metrics if metrics is not None else DEFAULT_REGISTRY
+        self.clock = clock
+        self._state_lock = threading.Lock()
+
+    def __str__(self):
+        return "RPC pool " + ", ".join(e.label for e in self.endpoints)
+
+    def ranked(self):
+        """Healthy endpoints by expected latency, then ejected ones by when they are due back."""
+        now, started = self.clock(), time.perf_counter()
+        with self._state_lock:
+            healthy = sorted((e for e in self.endpoints if e.ejected_until <= now), key=lambda e: e.score(started))
+            ejected = sorted((e for e in self.endpoints if e.ejected_until > now), key=lambda e: e.ejected_until)
+        return healthy + ejected
+
+    def _checked(self, response):
+        for item in response if isinstance(response, list) else [response]:
+            if is_endpoint_error(item):
+                raise EndpointError(response, item["error"])
+        return response
+
+    @staticmethod
+    def _give_up(error):
+        # Every endpoint failed: hand web3 the last JSON-RPC error reply, so it raises as usual
+        if isinstance(error, EndpointError):
+            return error.response
+        raise error
+
+    @staticmethod
+    def _accepted(response, params):
+        """A broadcast reply, with "already known" (the node has this transaction) turned into its hash."""
+        error = response.get("error")
+        if isinstance(error, dict) and is_already_known(error.get("message", "")):
+            return {"jsonrpc": "2.0", "id": response.get("id"), "result": Web3.to_hex(Web3.keccak(hexstr=params[0]))}
+        return response
+
+    def _hedge_allowed(self):
+        # Each hedged-method request earns hedge_budget tokens and a hedge spends one,
+        # so an overloaded pool doesn't double its own load
+        with self._state_lock:
+            if self._hedge_tokens < 1:
+                return False
+            self._hedge_tokens -= 1
+            return True
+
+    def _earn_hedge(self):
+        with self._state_lock:
+            self._hedge_tokens = min(self._hedge_tokens + self.hedge_budget, HEDGE_BURST)
+
+    def _started(self, endpoint):
+        start = time.perf_counter()
+        with self._state_lock:
+            endpoint.in_flight += 1
+            endpoint.started.append(start)
+        return start
+
+    def _succeeded(self, endpoint, start):
+        elapsed = time.perf_counter() - start
+        with self._state_lock:
+            endpoint.in_flight -= 1
+            endpoint.started.remove(start)
+            endpoint.latency = elapsed if endpoint.latency is None else endpoint.latency + self.latency_alpha * (elapsed - endpoint.latency)
+            endpoint.failures = 0
+            endpoint.ejections = 0
+            endpoint.ejected_until = 0.0
+        self.metrics.inc("rpc_endpoint_requests_total", endpoint=endpoint.label)
+        self.metrics.observe("rpc_endpoint_seconds", elapsed, endpoint=endpoint.label)
+
+    def _abandoned(self, endpoint, start):
+        # Cancelled before an answer: says nothing about the endpoint
+        with self._state_lock:
+            endpoint.in_flight -= 1
+            endpoint.started.remove(start)
+
+    def _failed(self, endpoint, start, error):
+        with self._state_lock:
+            endpoint.in_flight -= 1
+            endpoint.started.remove(start)
+            endpoint.failures += 1
+            # An endpoint back from ejection is on probation: one failure ejects it again
+            eject = endpoint.failures >= (1 if endpoint.ejections else self.max_failures)
+            if eject:
+                # Each consecutive ejection doubles the time out, until a request succeeds again
+                endpoint.ejections += 1
+                endpoint.failures = 0
+                duration = min(self.backoff * 2 ** (endpoint.ejections - 1), self.max_backoff)
+                endpoint.ejected_until = self.clock() + duration
+        self.metrics.inc("rpc_endpoint_requests_total", endpoint=endpoint.label)
+        self.metrics.inc("rpc_endpoint_errors_total", endpoint=endpoint.label)
+        if eject:
+            self.metrics.inc("rpc_endpoint_ejections_total", endpoint=endpoint.label)
+            logger.warning("Ejecting RPC endpoint %s for %.1fs: %s", endpoint.label, duration, error, extra={"event": "rpc_ejected", "endpoint": endpoint.label})
+
+    def stats(self):
+        now = self.clock()
+        with self._state_lock:
+            return [
+                {
+                    "endpoint": e.label,
+                    "latency_ms": e.latency * 1000 if e.latency is not None else None,
+                    "in_flight": e.in_flight,
+                    "failures": e.failures,
+                    "ejected_for": max(e.ejected_until - now, 0.0),
+                }
+                for e in self.endpoints
+            ]
+
+
+class RPCPool(_EndpointPool, JSONBaseProvider):
+    """
+    web3 provider spreading requests over several HTTP endpoints:
+
+    - each request goes to the healthy endpoint with the lowest expected
+      latency (moving average x requests in flight), failing over to the
+      next one if it raises;
+    - eth_call (hedge_methods) is re-sent to the next endpoint if no answer
+      arrives within hedge_after seconds, and the first answer wins; at
+      most hedge_budget extra requests per request are sent this way, and
+      none while max_workers // 4 losing requests are still running;
+    - eth_sendRawTransaction is broadcast to every endpoint, and counts as
+      accepted once one endpoint takes it or says it already has it;
+    - JSON-RPC errors blaming the endpoint (rate limits, -32005, -32603,
+      "header not found") count as failures like transport errors;
+    - an endpoint failing max_failures times in a row is ejected for
+      backoff seconds, doubling up to max_backoff while it keeps failing.
+      When every endpoint is ejected the one due back first is still used.
+
+        w3 = Web3(RPCPool(["https://mainnet.base.org", "https://base.llamarpc.com"]))
+
+    Member requests are not retried by web3; the pool does that across
+    endpoints. close() stops the pool's worker threads.
+    """
+
+    def __init__(self, urls, hedge_after=0.3, hedge_methods=HEDGED_METHODS, hedge_budget=0.1, max_failures=3, backoff=1.0, max_backoff=60.0, timeout=10.0, latency_alpha=0.2, max_workers=32, metrics=None, clock=time.monotonic):
+        super().__init__()
+        self._setup(
+            [Endpoint(url, Web3.HTTPProvider(url, request_kwargs={"timeout": timeout}, exception_retry_configuration=None)) for url in urls],
+            hedge_after, hedge_methods, hedge_budget, max_failures, backoff, max_backoff, latency_alpha, metrics, clock,
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prmission-rpc")
+        # Requests that lost a hedge race keep a worker until they finish or
+        # time out; no new hedges while this many are still running
+        self._max_losers = max(max_workers // 4, 1)
+        self._losers = 0
+
+    def _send(self, endpoint, send):
+        start = self._started(endpoint)
+        try:
+            response = self._checked(send(endpoint.provider))
+        except Exception as e:
+            self._failed(endpoint, start, e)
+            raise
+        self._succeeded(endpoint, start)
+        return response
+
+    def _failover(self, send):
+        error = None
+        for endpoint in self.ranked():
+            try:
+                return self._send(endpoint, send)
+            except Exception as e:
+                error = e
+        return self._give_up(error)
+
+    def _hedged(self, method, send):
+        self._earn_hedge()
+        candidates = iter(self.ranked())
+        pending = {}
+
+        def launch():
+            endpoint = next(candidates, None)
+            if endpoint is not None:
+                pending[self._executor.submit(self._send, endpoint, send)] = endpoint
+            return endpoint
+
+        first = launch()
+        hedged = False
+        error = None
+        while pending:
+            done, _ = wait(pending, timeout=None if hedged else self.hedge_after, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                if self._losers < self._max_losers and self._hedge_allowed() and launch() is not None:
+                    self.metrics.inc("rpc_hedges_total", method=method)
+                continue
+            for future in done:
+                endpoint = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if hedged and endpoint is not first:
+                    self.metrics.inc("rpc_hedge_wins_total", method=method)
+                self._abandon(pending)
+                return response
+            # Replace failed attempts, keeping two in flight once hedged
+            while len(pending) < (2 if hedged else 1) and launch() is not None:
+                pass
+        return self._give_up(error)
+
+    def _abandon(self, futures):
+        # Drop losers still queued; one already running finishes (and still
+        # updates its endpoint's latency) but counts against new hedges
+        for future in futures:
+            if future.cancel():
+                continue
+            with self._state_lock:
+                self._losers += 1
+            future.add_done_callback(self._loser_done)
+
+    def _loser_done(self, future):
+        with self._state_lock:
+            self._losers -= 1
+
+    def _broadcast(self, send, params):
+        futures = [self._executor.submit(self._send, endpoint, send) for endpoint in self.ranked()]
+        rejected = error = None
+        for future in as_completed(futures):
+            try:
+                response = self._accepted(future.result(), params)
+            except Exception as e:
+                error = e
+                continue
+            # One endpoint accepting is enough; the others usually answer "already known"
+            if "error" not in response:
+                return response
+            rejected = rejected or response
+        if rejected is not None:
+            return rejected
+        return self._give_up(error)
+
+    def make_request(self, method, params):
+        send = lambda provider: provider.make_request(method, params)
+        if method in BROADCAST_METHODS:
+            return self._broadcast(send, params)
+        if method in self.hedge_methods and self.hedge_after is not None and len(self.endpoints) > 1:
+            return self._hedged(method, send)
+        return self._failover(send)
+
+    def make_batch_request(self, requests):
+        return self._failover(lambda provider: provider.make_batch_request(requests))
+
+    def close(self):
+        """Stop the worker threads; requests still running (losing hedges) are not waited for."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncRPCPool(_EndpointPool, AsyncJSONBaseProvider):
+    """RPCPool for AsyncWeb3; hedges and broadcasts with tasks on the running loop."""
+
+    def __init__(self, urls, hedge_after=0.3, hedge_methods=HEDGED_METHODS, hedge_budget=0.1, max_failures=3, backoff=1.0, max_backoff=60.0, timeout=10.0, latency_alpha=0.2, metrics=None, clock=time.monotonic):
+        super().__init__()
+        self._setup(
+            [Endpoint(url, AsyncWeb3.AsyncHTTPProvider(url, request_kwargs={"timeout": ClientTimeout(timeout)}, exception_retry_configuration=None)) for url in urls],
+            hedge_after, hedge_methods, hedge_budget, max_failures, backoff, max_backoff, latency_alpha, metrics, clock,
+        )
+        # Losing hedges and extra broadcasts finish in the background; hold a reference until they do
+        self._background = set()
+
+    async def _send(self, endpoint, send):
+        start = self._started(endpoint)
+        try:
+            response = self._checked(await send(endpoint.provider))
+        except asyncio.CancelledError:
+            self._abandoned(endpoint, start)
+            raise
+        except Exception as e:
+            self._failed(endpoint, start, e)
+            raise
+        self._succeeded(endpoint, start)
+        return response
+
+    def _detach(self, tasks):
+        for task in tasks:
+            self._background.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task):
+        self._background.discard(task)
+        if not task.cancelled():
+            task.exception()
+
+    async def _failover(self, send):
+        error = None
+        for endpoint in self.ranked():
+            try:
+                return await self._send(endpoint, send)
+            except Exception as e:
+                error = e
+        return self._give_up(error)
+
+    async def _hedged(self, method, send):
+        self._earn_hedge()
+        candidates = iter(self.ranked())
+        pending = {}
+
+        def launch():
+            endpoint = next(candidates, None)
+            if endpoint is not None:
+                pending[asyncio.ensure_future(self._send(endpoint, send))] = endpoint
+            return endpoint
+
+        first = launch()
+        hedged = False
+        error = None
+        while pending:
+            done, _ = await asyncio.wait(pending, timeout=None if hedged else self.hedge_after, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                if self._hedge_allowed() and launch() is not None:
+                    self.metrics.inc("rpc_hedges_total", method=method)
+                continue
+            for task in done:
+                endpoint = pending.pop(task)
+                try:
+                    response = task.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if hedged and endpoint is not first:
+                    self.metrics.inc("rpc_hedge_wins_total", method=method)
+                self._detach(pending)
+                return response
+            # Replace failed attempts, keeping two in flight once hedged
+            while len(pending) < (2 if hedged else 1) and launch() is not None:
+                pass
+        return self._give_up(error)
+
+    async def _broadcast(self, send, params):
+        pending = {asyncio.ensure_future(self._send(endpoint, send)) for endpoint in self.ranked()}
+        rejected = error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    response = self._accepted(task.result(), params)
+                except Exception as e:
+                    error = e
+                    continue
+                if "error" not in response:
+                    self._detach(pending)
+                    return response
+                rejected = rejected or response
+        if rejected is not None:
+            return rejected
+        return self._give_up(error)
+
+    async def make_request(self, method, params):
+        send = lambda provider: provider.make_request(method, params)
+        if method in BROADCAST_METHODS:
+            return await self._broadcast(send, params)
+        if method in self.hedge_methods and self.hedge_after is not None and len(self.endpoints) > 1:
+            return await self._hedged(method, send)
+        return await self._failover(send)
+
+    async def make_batch_request(self, requests):
+        return await self._failover(lambda provider: provider.make_batch_request(requests))
+
+    async def cache_async_session(self, session):
+        for endpoint in self.endpoints:
+            await endpoint.provider.cache_async_session(session)
+        return session
+
+    async def disconnect(self):
+        for endpoint in self.endpoints:
+            await endpoint.provider.disconnect()
@@ -0,0 +1,175 @@
+import time
+from eth_utils.toolz import curry
+from web3 import AsyncWeb3, Web3
+from web3.middleware import ExtraDataToPOAMiddleware
+from web3.middleware.base import Web3MiddlewareBuilder
+from .pool import AsyncRPCPool, RPCPool
+
+
+class ChainIdCacheMiddleware(Web3MiddlewareBuilder):
+    """
+    Answers eth_chainId from memory after the first successful call. web3
+    checks the node's chain id before every eth_call, eth_estimateGas and
+    transaction, which otherwise costs a round trip each. Add it as the
+    outermost layer so those lookups never reach the provider:
+
+        w3.middleware_onion.add(ChainIdCacheMiddleware.build({}), "chain_id_cache")
+    """
+
+    memo = None
+
+    @staticmethod
+    @curry
+    def build(memo, w3):
+        middleware = ChainIdCacheMiddleware(w3)
+        middleware.memo = memo
+        return middleware
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            if method != "eth_chainId":
+                return make_request(method, params)
+            if "response" not in self.memo:
+                response = make_request(method, params)
+                if "result" not in response:
+                    return response
+                self.memo["response"] = response
+            return self.memo["response"]
+
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method, params):
+            if method != "eth_chainId":
+                return await make_request(method, params)
+            if "response" not in self.memo:
+                response = await make_request(method, params)
+                if "result" not in response:
+                    return response
+                self.memo["response"] = response
+            return self.memo["response"]
+
+        return middleware
+
+
+def _size(payload):
+    # Size of the JSON-RPC payload as encoded, not counting HTTP framing
+    try:
+        return len(Web3.to_json(payload))
+    except TypeError:
+        return 0
+
+
+class RPCMetricsMiddleware(Web3MiddlewareBuilder):
+    """
+    web3 middleware recording, per JSON-RPC method: rpc_requests_total,
+    rpc_errors_total and rpc_seconds. Batches are counted per method and
+    timed as a whole under rpc_batch_seconds.
+
+        w3.middleware_onion.inject(RPCMetricsMiddleware.build(registry), "prmission_metrics", layer=0)
+
+    measure_bytes=True also records rpc_request_bytes_total and
+    rpc_response_bytes_total. That re-encodes every payload as JSON (large
+    eth_getLogs pages included), so it is off by default.
+    """
+
+    registry = None
+    measure_bytes = False
+
+    @staticmethod
+    @curry
+    def build(registry, w3, measure_bytes=False):
+        middleware = RPCMetricsMiddleware(w3)
+        middleware.registry = registry
+        middleware.measure_bytes = measure_bytes
+        return middleware
+
+    def _record(self, method, params, response, elapsed):
+        registry = self.registry
+        registry.inc("rpc_requests_total", method=method)
+        if elapsed is not None:
+            registry.observe("rpc_seconds", elapsed, method=method)
+        if response is None or "error" in response:
+            registry.inc("rpc_errors_total", method=method)
+        if self.measure_bytes:
+            registry.inc("rpc_request_bytes_total", _size({"method": method, "params": params}), method=method)
+            if response is not None:
+                registry.inc("rpc_response_bytes_total", _size(response), method=method)
+
+    def _record_batch(self, requests_info, responses, elapsed):
+        self.registry.inc("rpc_batches_total")
+        self.registry.observe("rpc_batch_seconds", elapsed)
+        self.registry.observe("rpc_batch_size", len(requests_info))
+        if not isinstance(responses, list):
+            responses = [responses] * len(requests_info)
+        for (method, params), response in zip(requests_info, responses):
+            self._record(method, params, response, None)
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            start = time.perf_counter()
+            response = None
+            try:
+                response = make_request(method, params)
+                return response
+            finally:
+                self._record(method, params, response, time.perf_counter() - start)
+
+        return middleware
+
+    def wrap_make_batch_request(self, make_batch_request):
+        def middleware(requests_info):
+            start = time.perf_counter()
+            responses = None
+            try:
+                responses = make_batch_request(requests_info)
+                return responses
+            finally:
+                self._record_batch(requests_info, responses, time.perf_counter() - start)
+
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method, params):
+            start = time.perf_counter()
+            response = None
+            try:
+                response = await make_request(method, params)
+                return response
+            finally:
+                self._record(method, params, response, time.perf_counter() - start)
+
+        return middleware
+
+    async def async_wrap_make_batch_request(self, make_batch_request):
+        async def middleware(requests_info):
+            start = time.perf_counter()
+            responses = None
+            try:
+                responses = await make_batch_request(requests_info)
+                return responses
+            finally:
+                self._record_batch(requests_info, responses, time.perf_counter() - start)
+
+        return middleware
+
+
+def make_w3(rpc_url, metrics, asynchronous=False):
+    """
+    Web3 (or AsyncWeb3) for a URL, a list of URLs to pool, or a ready-made
+    provider, with the SDK's middleware: POA extraData, the chain id cache
+    and, if metrics are enabled, RPCMetricsMiddleware.
+    """
+    web3_class, http_provider, pool_class = (AsyncWeb3, AsyncWeb3.AsyncHTTPProvider, AsyncRPCPool) if asynchronous else (Web3, Web3.HTTPProvider, RPCPool)
+    if isinstance(rpc_url, str):
+        provider = http_provider(rpc_url)
+    elif isinstance(rpc_url, (list, tuple)):
+        provider = pool_class(rpc_url, metrics=metrics)
+    else:
+        provider = rpc_url
+    w3 = web3_class(provider)
+    w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+    w3.middleware_onion.add(ChainIdCacheMiddleware.build({}), "chain_id_cache")
+    if metrics.enabled:
+        w3.middleware_onion.inject(RPCMetricsMiddleware.build(metrics), "prmission_metrics", layer=0)
+    return w3
@@ -0,0 +1,198 @@
+import heapq
+import logging
+import time
+from web3.exceptions import TransactionNotFound
+from .constants import DISPUTE_WINDOW, REVOCATION_GRACE, PermissionStatus, EscrowStatus
+
+logger = logging.getLogger(__name__)
+
+SETTLE = "settle"
+REFUND = "refund"
+# The escrow status each action needs; in any other status the transaction reverts
+REQUIRED_STATUS = {SETTLE: EscrowStatus.OUTCOME_REPORTED, REFUND: EscrowStatus.FUNDED}
+
+
+class SettlementSweeper:
+    """
+    Long-running scheduler that settles escrows once their dispute window has
+    closed and refunds escrows on revoked permissions once the revocation
+    grace period has passed (the only refunds the contract allows to anyone).
+
+    Due work sits in a priority queue ordered by due time and is submitted
+    through the SDK's nonce-pipelined submit path with at most max_in_flight
+    transactions outstanding. Failed submissions are retried with backoff
+    while the escrow is still in the status the action needs; after
+    max_retries the escrow is given up for the life of the sweeper. Nothing
+    new is submitted once gas_budget (wei) has been spent.
+
+    Candidates come from an EventIndexer when one is given, otherwise from
+    batched escrow reads walking nextEscrowId. Time is read from the latest
+    block so local chains with time travel behave like mainnet.
+    """
+
+    def __init__(self, sdk, indexer=None, max_in_flight=16, max_retries=3, retry_delay=30, gas_budget=None, any_party=False, clock=None):
+        self.sdk = sdk
+        self.indexer = indexer
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.gas_budget = gas_budget
+        self.any_party = any_party
+        self.clock = clock or (lambda: sdk.w3.eth.get_block("latest")["timestamp"])
+        self._queue = []
+        self._queued = set()
+        self._attempts = {}
+        self._given_up = set()
+        self._open = set()
+        self._scanned_to = 0
+        self._started = time.time()
+        self.stats = {"settled": 0, "refunded": 0, "failed": 0, "retries": 0, "dropped": 0, "gas_spent_wei": 0, "sweeps": 0}
+
+    # ─── Discovery ──────────────────────────────────────────────────────
+
+    def _candidates(self):
+        if self.indexer is not None:
+            self.indexer.sync()
+            rows = self.indexer.escrows(status=EscrowStatus.OUTCOME_REPORTED) + self.indexer.escrows(status=EscrowStatus.FUNDED)
+            return [(e["id"], e, self.indexer.get_permission(e["permission_id"])) for e in rows]
+        next_id = self.sdk.contract.functions.nextEscrowId().call()
+        ids = sorted(self._open) + list(range(self._scanned_to + 1, next_id))
+        self._scanned_to = next_id - 1
+        escrows = dict(zip(ids, self.sdk.get_escrows(ids)))
+        self._open = {i for i, e in escrows.items() if e and e["status"] in (EscrowStatus.FUNDED, EscrowStatus.OUTCOME_REPORTED)}
+        perm_ids = sorted({escrows[i]["permission_id"] for i in self._open})
+        perms = dict(zip(perm_ids, self.sdk.get_permissions(perm_ids)))
+        return [(i, escrows[i], perms[escrows[i]["permission_id"]]) for i in sorted(self._open)]
+
+    def _authorized(self, escrow, perm):
+        return self.any_party or self.sdk.address in (escrow["agent"], perm["user"])
+
+    def refresh(self):
+        """Queue every escrow that is, or will become, settleable or refundable."""
+        for escrow_id, escrow, perm in self._candidates():
+            if escrow_id in self._queued or escrow_id in self._given_up or perm is None:
+                continue
+            if escrow["status"] == EscrowStatus.OUTCOME_REPORTED and self._authorized(escrow, perm):
+                self._push(escrow["reported_at"] + DISPUTE_WINDOW, escrow_id, SETTLE)
+            elif escrow["status"] == EscrowStatus.FUNDED and perm["status"] == PermissionStatus.REVOKED:
+                self._push(perm["revoked_at"] + REVOCATION_GRACE, escrow_id, REFUND)
+
+    def _push(self, due, escrow_id, action):
+        heapq.heappush(self._queue, (due, escrow_id, action))
+        self._queued.add(escrow_id)
+
+    # ─── Submission ─────────────────────────────────────────────────────
+
+    def _submit(self, escrow_id, action):
+        if action == SETTLE:
+            return self.sdk.settle(escrow_id, wait=False)
+        return self.sdk.refund_escrow(escrow_id, wait=False)
+
+    def _budget_left(self):
+        return self.gas_budget is None or self.stats["gas_spent_wei"] < self.gas_budget
+
+    def _still_required(self, escrow_id, action):
+        # Someone else may have settled, refunded or disputed it first
+        try:
+            return self.sdk.get_escrow(escrow_id)["status"] == REQUIRED_STATUS[action]
+        except Exception as e:
+            # Can't tell: assume it still is, the retry limit bounds the cost
+            logger.warning("Sweeper could not read escrow #%s: %s", escrow_id, e)
+            return True
+
+    def _failed(self, now, escrow_id, action, error):
+        retry_at = None
+        try:
+            if not self._still_required(escrow_id, action):
+                self.stats["dropped"] += 1
+                return
+            attempts = self._attempts.get(escrow_id, 0) + 1
+            if attempts > self.max_retries:
+                self.stats["failed"] += 1
+                self._given_up.add(escrow_id)
+                logger.warning("Sweeper gave up on escrow #%s (%s): %s", escrow_id, action, error)
+                return
+            self._attempts[escrow_id] = attempts
+            self.stats["retries"] += 1
+            retry_at = now + self.retry_delay * 2 ** (attempts - 1)
+        finally:
+            # Whatever happened above, the escrow is either queued again or not tracked at all
+            if retry_at is None:
+                self._queued.discard(escrow_id)
+                self._attempts.pop(escrow_id, None)
+            else:
+                heapq.heappush(self._queue, (retry_at, escrow_id, action))
+
+    def _collect(self, now, escrow_id, action, pending):
+        try:
+            receipt = pending.receipt()
+        except Exception as e:
+            self._charge(self._mined_receipt(pending))
+            self._failed(now, escrow_id, action, e)
+            return
+        self._charge(receipt)
+        self.stats["settled" if action == SETTLE else "refunded"] += 1
+        self._queued.discard(escrow_id)
+        self._attempts.pop(escrow_id, None)
+
+    def _mined_receipt(self, pending):
+        # Reverted transactions still burn gas against the budget
+        try:
+            return self.sdk.w3.eth.get_transaction_receipt(pending.tx_hash)
+        except TransactionNotFound:
+            return None
+        except Exception as e:
+            logger.warning("Sweeper could not fetch the receipt of %s: %s", pending.tx_hash.hex(), e)
+            return None
+
+    def _charge(self, receipt):
+        if receipt is not None:
+            self.stats["gas_spent_wei"] += receipt["gasUsed"] * receipt.get("effectiveGasPrice", 0)
+
+    def sweep(self, now=None):
+        """Submit everything due at `now` and wait for it. Returns the number of escrows closed."""
+        now = self.clock() if now is None else now
+        closed = self.stats["settled"] + self.stats["refunded"]
+        in_flight = []
+        try:
+            while self._queue and self._queue[0][0] <= now and self._budget_left():
+                due, escrow_id, action = heapq.heappop(self._queue)
+                try:
+                    in_flight.append((escrow_id, action, self._submit(escrow_id, action)))
+                except Exception as e:
+                    self._failed(now, escrow_id, action, e)
+                if len(in_flight) >= self.max_in_flight:
+                    self._collect(now, *in_flight.pop(0))
+        finally:
+            # Every submitted transaction is waited for, even if the loop above raised
+            for item in in_flight:
+                self._collect(now, *item)
+        self.stats["sweeps"] += 1
+        return self.stats["settled"] + self.stats["refunded"] - closed
+
+    def run(self, poll_interval=15.0, stop=None):
+        """Refresh and sweep until stop (a threading.Event) is set."""
+        while stop is None or not stop.is_set():
+            try:
+                self.refresh()
+                self.sweep()
+            except Exception as e:
+                logger.exception("Sweeper error: %s", e)
+            time.sleep(poll_interval)
+
+    # ─── Metrics ────────────────────────────────────────────────────────
+
+    def metrics(self, now=None):
+        now = self.clock() if now is None else now
+        overdue = [due for due, _, _ in self._queue if due <= now]
+        elapsed = max(time.time() - self._started, 1e-9)
+        closed = self.stats["settled"] + self.stats["refunded"]
+        return {
+            **self.stats,
+            "backlog": len(self._queue),
+            "overdue": len(overdue),
+            "oldest_overdue_seconds": now - min(overdue) if overdue else 0,
+            "next_due_in_seconds": max(self._queue[0][0] - now, 0) if self._queue else None,
+            "closed_per_minute": closed * 60 / elapsed,
+            "budget_exhausted": not self._budget_left(),
+        }
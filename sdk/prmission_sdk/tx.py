@@ -0,0 +1,87 @@
+import logging
+import time
+from web3.exceptions import Web3RPCError
+from .metrics import record_receipt
+from .nonce import is_already_known, is_nonce_error, is_nonce_gap
+
+logger = logging.getLogger(__name__)
+
+# What submit_tx does after send_raw_transaction raised; None means re-raise
+ALREADY_KNOWN = "already_known"
+RESYNC = "resync"
+UNCONFIRMED = "unconfirmed"
+
+
+class BasePendingTx:
+    """
+    Bookkeeping shared by PendingTx and AsyncPendingTx, which only add the
+    (blocking or awaited) receipt wait and decode on top.
+    """
+
+    def __init__(self, sdk, tx_hash, nonce, description="", decode=None, tx_func=None, gas_estimate=None, gas_profile=None):
+        self.sdk = sdk
+        self.tx_hash = tx_hash
+        self.nonce = nonce
+        self.description = description
+        self._decode = decode
+        self.tx_func = tx_func
+        self.fn_name = tx_func.fn_name if tx_func is not None else "unknown"
+        self.gas_estimate = gas_estimate
+        self.gas_profile = gas_profile
+        self.sent_at = time.monotonic()
+        self._receipt = None
+
+    def _replaced(self, mined_nonce):
+        """True if another transaction consumed our nonce; we then move past it."""
+        if mined_nonce <= self.nonce:
+            return False
+        self.sdk.nonces.resync(mined_nonce)
+        return True
+
+    def _accept(self, receipt):
+        sdk = self.sdk
+        record_receipt(sdk.metrics, self, receipt)
+        sdk.gas_estimates.on_receipt(self.gas_profile, receipt)
+        if receipt["status"] != 1:
+            raise Exception(f"Transaction failed: {self.tx_hash.hex()}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Confirmed in block %s | https://basescan.org/tx/%s", receipt["blockNumber"], self.tx_hash.hex(), extra={"event": "tx_confirmed", "fn": self.fn_name, "tx_hash": self.tx_hash.hex(), "block": receipt["blockNumber"], "gas_used": receipt["gasUsed"]})
+        if self.tx_func is not None:
+            sdk.cache.on_transaction(sdk.address, self.tx_func.fn_name, self.tx_func.args)
+        self._receipt = receipt
+        return receipt
+
+
+def send_error_action(sdk, exc, nonce, fn_name, can_retry):
+    """
+    Classify an error from send_raw_transaction:
+
+    - ALREADY_KNOWN: the node holds this signed transaction, e.g. web3
+      retried a send whose reply was lost;
+    - RESYNC: our nonce was already spent; take the chain's and retry if
+      can_retry, else re-raise;
+    - UNCONFIRMED: no verdict from the node (e.g. an HTTP timeout), so the
+      transaction may or may not have reached it: look it up;
+    - None: the node rejected it; the nonce has been given back, re-raise.
+    """
+    if is_already_known(exc):
+        return ALREADY_KNOWN
+    if is_nonce_error(exc):
+        sdk.metrics.inc("tx_nonce_resyncs_total" if can_retry else "tx_send_errors_total", fn=fn_name)
+        return RESYNC
+    sdk.metrics.inc("tx_send_errors_total", fn=fn_name)
+    if is_nonce_gap(exc):
+        logger.warning("Nonce gap: node rejected nonce %s for %s, an earlier transaction has not reached it", nonce, fn_name, extra={"event": "tx_nonce_gap", "fn": fn_name, "nonce": nonce})
+    elif not isinstance(exc, Web3RPCError):
+        return UNCONFIRMED
+    # A rejected transaction leaves its nonce unused
+    sdk.nonces.release(nonce)
+    return None
+
+
+def record_sent(sdk, tx_func, tx, tx_hash, description, gas_estimate):
+    fn_name = tx_func.fn_name
+    sdk.metrics.inc("tx_sent_total", fn=fn_name)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Sent: %s | nonce: %s | tx: %s", description, tx["nonce"], tx_hash.hex(), extra={"event": "tx_sent", "fn": fn_name, "nonce": tx["nonce"], "tx_hash": tx_hash.hex(), "gas_estimate": gas_estimate})
+    sdk.cache.on_transaction(sdk.address, fn_name, tx_func.args)
@@ -0,0 +1,55 @@
+"""
+Shared fixtures. `chain` deploys MockUSDC + PrmissionV2 from the Hardhat
+artifacts to a local node (once per test module) and skips when there is
+no node at PRMISSION_TEST_RPC or no artifacts in PRMISSION_ARTIFACTS.
+"""
+import json
+import os
+import sys
+
+import pytest
+from eth_account import Account
+from web3 import Web3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from prmission_sdk import PrmissionSDK
+
+RPC_URL = os.getenv("PRMISSION_TEST_RPC", "http://127.0.0.1:8545")
+ARTIFACTS = os.getenv("PRMISSION_ARTIFACTS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "artifacts", "contracts"))
+HARDHAT_MNEMONIC = "test test test test test test test test test test test junk"
+
+
+def load_artifact(name):
+    with open(os.path.join(ARTIFACTS, f"{name}.sol", f"{name}.json")) as f:
+        artifact = json.load(f)
+    return artifact["abi"], artifact["bytecode"]
+
+
+def deploy(w3, deployer, name, *args):
+    abi, bytecode = load_artifact(name)
+    tx = w3.eth.contract(abi=abi, bytecode=bytecode).constructor(*args).build_transaction({"from": deployer.address, "nonce": w3.eth.get_transaction_count(deployer.address)})
+    tx_hash = w3.eth.send_raw_transaction(deployer.sign_transaction(tx).raw_transaction)
+    return w3.eth.wait_for_transaction_receipt(tx_hash)["contractAddress"], abi
+
+
+@pytest.fixture(scope="module")
+def chain():
+    w3 = Web3(Web3.HTTPProvider(RPC_URL))
+    if not w3.is_connected():
+        pytest.skip(f"no node at {RPC_URL}")
+    if not os.path.isdir(ARTIFACTS):
+        pytest.skip(f"no Hardhat artifacts in {ARTIFACTS} (run npx hardhat compile)")
+    Account.enable_unaudited_hdwallet_features()
+    deployer, user, agent, other = (Account.from_mnemonic(HARDHAT_MNEMONIC, account_path=f"m/44'/60'/0'/0/{i}") for i in range(4))
+    usdc, usdc_abi = deploy(w3, deployer, "MockUSDC")
+    prmission, prmission_abi = deploy(w3, deployer, "PrmissionV2", usdc, deployer.address)
+    token = w3.eth.contract(address=usdc, abi=usdc_abi)
+    tx = token.functions.mint(agent.address, 2**200).build_transaction({"from": deployer.address, "nonce": w3.eth.get_transaction_count(deployer.address)})
+    w3.eth.wait_for_transaction_receipt(w3.eth.send_raw_transaction(deployer.sign_transaction(tx).raw_transaction))
+
+    def sdk(account, **kwargs):
+        return PrmissionSDK(account.key, rpc_url=RPC_URL, contract_address=prmission, usdc_address=usdc, chain_id=w3.eth.chain_id, **{"multicall_address": None, "cache_size": 0, **kwargs})
+
+    # The artifact ABI, for previewSettlement's disputeWindowEnd which the SDK does not decode
+    contract = w3.eth.contract(address=prmission, abi=prmission_abi)
+    return {"w3": w3, "contract": contract, "user": sdk(user), "agent": sdk(agent), "other": other.address, "sdk": lambda **kwargs: sdk(agent, **kwargs)}
@@ -0,0 +1,138 @@
+"""
+TTLCache expiry, invalidation and eviction; StateCache invalidation rules;
+and that callers never share dicts with the cache, through the SDK getters
+on a local chain (the `chain` fixture in conftest.py).
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from prmission_sdk.cache import MISSING, StateCache, TTLCache
+from prmission_sdk.constants import EscrowStatus, PermissionStatus
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def escrow(status=EscrowStatus.FUNDED, amount=10**6):
+    return {"status": status, "amount": amount}
+
+
+# ─── TTLCache ───────────────────────────────────────────────────────────
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = TTLCache(ttl=5, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=None)
+    clock.now = 4.9
+    assert cache.get("a") == 1
+    clock.now = 5
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == 2
+    assert cache.stats()["size"] == 1
+
+
+def test_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_maxsize_zero_disables():
+    cache = TTLCache(maxsize=0)
+    cache.set("a", 1)
+    assert cache.get("a") is MISSING
+
+
+def test_invalidate():
+    cache = TTLCache()
+    for key in [(1, "x"), (1, "y"), (2, "x")]:
+        cache.set(key, True)
+    cache.invalidate((2, "x"))
+    assert cache.get((2, "x")) is MISSING
+    cache.invalidate_where(lambda key: key[0] == 1)
+    assert cache.stats()["size"] == 0
+
+
+# ─── StateCache ─────────────────────────────────────────────────────────
+
+
+def test_terminal_escrows_outlive_ttl():
+    cache = StateCache(ttl=5)
+    clock = Clock()
+    cache.escrows.clock = clock
+    cache.store_escrow(1, escrow(EscrowStatus.FUNDED))
+    cache.store_escrow(2, escrow(EscrowStatus.SETTLED))
+    cache.store_escrow(3, escrow(EscrowStatus.NONE))
+    clock.now = 60
+    assert cache.get_escrow(1) is MISSING
+    assert cache.get_escrow(2)["status"] == EscrowStatus.SETTLED
+    assert cache.get_escrow(3) is MISSING
+
+
+def test_transactions_and_events_invalidate():
+    cache = StateCache()
+    perm = {"user": "0xu", "merchant": "0xm", "data_category": "c", "purpose": "p", "compensation_bps": 1000, "upfront_fee": 0, "valid_until": 10, "created_at": 1, "status": PermissionStatus.ACTIVE, "status_name": "ACTIVE", "revoked_at": 0}
+    cache.store_permission(7, perm)
+    cache.store_access(7, "0xa", {"permitted": True})
+    cache.store_escrow(1, escrow())
+    cache.store_allowance("0xa", 5)
+    cache.on_transaction("0xa", "revokePermission", (7,))
+    assert cache.get_permission(7) is MISSING and cache.get_access(7, "0xa") is MISSING
+    assert cache.get_terms(7)["purpose"] == "p"
+    cache.on_transaction("0xa", "depositEscrow", (7, 1, 0))
+    assert cache.get_allowance("0xa") is MISSING
+    cache.apply_event("SettlementCompleted", {"escrowId": 1})
+    assert cache.get_escrow(1) is MISSING
+
+
+def test_stored_and_returned_values_are_copies():
+    cache = StateCache()
+    stored, access, preview = escrow(), {"permitted": True}, {"user_share": 1, "protocol_fee": 0, "agent_refund": 0}
+    cache.store_escrow(1, stored)
+    cache.store_access(7, "0xa", access)
+    cache.store_preview(1, preview)
+    stored["amount"], access["permitted"], preview["user_share"] = 0, False, 0
+    first = cache.get_escrow(1)
+    first["amount"] = 0
+    assert cache.get_escrow(1)["amount"] == 10**6
+    assert cache.get_access(7, "0xa")["permitted"] is True
+    assert cache.get_preview(1)["user_share"] == 1
+
+
+# ─── Through the SDK ────────────────────────────────────────────────────
+
+
+def test_sdk_results_do_not_alias_the_cache(chain):
+    user, agent = chain["user"], chain["agent"]
+    perm_id = user.grant_permission("cache", "aliasing", 1000, 10**8)
+    escrow_id = agent.deposit_escrow(perm_id, 10**6)
+    sdk = chain["sdk"](cache_size=100, cache_ttl=60)
+
+    for result in (sdk.get_escrow(escrow_id), sdk.get_escrows([escrow_id])[0]):
+        result["amount"] = 0
+    sdk.cache.invalidate_escrow(escrow_id)
+    sdk.get_escrows([escrow_id])[0]["amount"] = 0
+    assert sdk.get_escrow(escrow_id)["amount"] == 10**6
+
+    sdk.check_access(perm_id)["permitted"] = False
+    sdk.check_access_many([(perm_id, None)])[0]["compensation_bps"] = 0
+    access = sdk.check_access(perm_id)
+    assert access["permitted"] is True and access["compensation_bps"] == 1000
+
+    sdk.preview_settlement(escrow_id)["user_share"] = 0
+    sdk.preview_settlements([escrow_id])[0]["user_share"] = 0
+    assert sdk.preview_settlement(escrow_id)["user_share"] == 10**5
+    assert sdk.cache.stats()["escrows"]["hits"] > 0
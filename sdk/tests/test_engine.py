@@ -0,0 +1,104 @@
+"""
+The *_batch helpers against the scalar functions, row for row, on both the
+uint64 and the Python-int (object dtype) paths, including the rows where
+the contract reverts.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from prmission_sdk import engine
+from prmission_sdk.engine import UINT256_MAX
+
+np = pytest.importorskip("numpy")
+
+SMALL_AMOUNTS = [1, 33, 34, 9_999, 10_000, 10_001, 10**6, 123_456_789, 2**40]
+LARGE_AMOUNTS = [2**64 - 1, 2**64, 2**128 + 7, UINT256_MAX // 10_000, UINT256_MAX // 300]
+BPS = [0, 1, 2500, 4999, 5000, 9700, 10_000]
+# Well inside every range, to push a batch onto the object path without changing other rows
+BIG_VALID = 2**100
+
+
+def outcome(fn, *args):
+    """fn's result as plain ints, or the exception type it raised."""
+    try:
+        return tuple(int(v) for v in fn(*args))
+    except (ValueError, ArithmeticError) as e:
+        return type(e)
+
+
+def batch_rows(batch_fn, amounts, bps):
+    result = batch_fn(amounts, bps)
+    return [tuple(int(result[k][i]) for k in ("user_share", "protocol_fee", "agent_refund")) for i in range(len(amounts))]
+
+
+@pytest.mark.parametrize("scalar_fn, batch_fn", [(engine.settlement_split, engine.settlement_split_batch), (engine.dispute_split, engine.dispute_split_batch)])
+@pytest.mark.parametrize("bps", BPS)
+def test_batch_matches_scalar(scalar_fn, batch_fn, bps):
+    for amounts in (SMALL_AMOUNTS, LARGE_AMOUNTS):
+        expected = [outcome(scalar_fn, amount, bps) for amount in amounts]
+        valid = [amount for amount, e in zip(amounts, expected) if isinstance(e, tuple)]
+        if valid:
+            assert batch_fn(valid, bps)["user_share"].dtype == (np.uint64 if amounts is SMALL_AMOUNTS else object)
+            assert batch_rows(batch_fn, valid, bps) == [e for e in expected if isinstance(e, tuple)]
+            # The same rows on the object path
+            if outcome(scalar_fn, BIG_VALID, bps) != ArithmeticError:
+                assert batch_rows(batch_fn, valid + [BIG_VALID], bps)[:-1] == [e for e in expected if isinstance(e, tuple)]
+        for amount, e in zip(amounts, expected):
+            if not isinstance(e, tuple):
+                # A reverting row fails the whole batch the same way, on either path
+                for rows in ([amount], [1, amount]):
+                    with pytest.raises(e):
+                        batch_fn(rows, bps)
+
+
+@pytest.mark.parametrize("amount, bps, error", [
+    (2**250, 5000, ArithmeticError),
+    (2**250, 0, ArithmeticError),
+    (10_000, 9800, ArithmeticError),
+    (UINT256_MAX + 1, 0, ValueError),
+])
+def test_settlement_reverts(amount, bps, error):
+    with pytest.raises(error):
+        engine.settlement_split(amount, bps)
+    with pytest.raises(error):
+        engine.settlement_split_batch([amount], bps)
+
+
+@pytest.mark.parametrize("amount, bps, error", [
+    (2**250, 0, ArithmeticError),
+    (2**247, 10_000, ArithmeticError),
+    (10**6, 10_001, ValueError),
+    (UINT256_MAX + 1, 0, ValueError),
+])
+def test_dispute_reverts(amount, bps, error):
+    with pytest.raises(error):
+        engine.dispute_split(amount, bps)
+    with pytest.raises(error):
+        engine.dispute_split_batch([amount], bps)
+
+
+def test_per_row_bps():
+    bps = [b for b in BPS if b + 300 <= 10_000]
+    result = engine.settlement_split_batch([10**6] * len(bps), bps)
+    assert [int(v) for v in result["user_share"]] == [engine.settlement_split(10**6, b)[0] for b in bps]
+
+
+def test_mixed_int64_and_uint64_lists():
+    # numpy would make this list float64
+    amounts = [1, 2**63, 2**64 - 1]
+    assert batch_rows(engine.settlement_split_batch, amounts, 1000) == [engine.settlement_split(a, 1000) for a in amounts]
+    with pytest.raises(TypeError):
+        engine.settlement_split_batch([1, 2**63, 0.5], 1000)
+
+
+def test_outcome_values_are_capped():
+    result = engine.settlement_split_batch([100, 200], 1000, outcome_values=[150, 50])
+    assert [int(v) for v in result["outcome_value"]] == [100, 50]
+
+
+def test_empty_batch():
+    result = engine.settlement_split_batch([], 1000)
+    assert all(len(column) == 0 for column in result.values())
@@ -0,0 +1,109 @@
+"""
+Differential tests: prmission_sdk.engine against a deployed PrmissionV2.
+
+Deploys MockUSDC + PrmissionV2 from the Hardhat artifacts to a local node
+and checks that the offline settlement math and access rules agree with
+previewSettlement, checkAccess and refundEscrow, including at the rounding
+and time boundaries. Skipped when no node or no artifacts are available
+(see the chain fixture in conftest.py).
+
+    npx hardhat compile && npx hardhat node
+    python -m pytest tests/test_engine_differential.py
+"""
+import os
+import random
+import sys
+
+import pytest
+from web3.exceptions import ContractLogicError, Web3RPCError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from prmission_sdk import engine
+from prmission_sdk.constants import BPS_DENOMINATOR, REVOCATION_GRACE
+
+BPS_VALUES = [0, 1, 2500, 4999, 5000]
+
+
+def boundary_amounts(bps):
+    """Amounts where amount * bps or amount * PROTOCOL_FEE_BPS lands on, just below or just above a multiple of 10_000."""
+    amounts = {1, 2, 33, 34, 9_999, 10_000, 10_001, 10**6, 2**64 - 1, 2**64, 2**128}
+    for factor in (bps, 300):
+        if factor:
+            step = BPS_DENOMINATOR // factor if BPS_DENOMINATOR % factor == 0 else BPS_DENOMINATOR
+            amounts.update({step - 1, step, step + 1, 7 * step - 1, 7 * step, 7 * step + 1})
+    return sorted(a for a in amounts if a > 0)
+
+
+def random_amounts(rng, count=8):
+    return [rng.randrange(1, 10**12) for _ in range(count // 2)] + [rng.randrange(1, 2**128) for _ in range(count - count // 2)]
+
+
+def mine_at(w3, timestamp):
+    """Mine a block at exactly `timestamp`; returns its number for calls in that block's context."""
+    w3.provider.make_request("evm_setNextBlockTimestamp", [timestamp])
+    w3.provider.make_request("evm_mine", [])
+    block = w3.eth.get_block("latest")
+    assert block["timestamp"] == timestamp
+    return block["number"]
+
+
+def head_time(w3):
+    return w3.eth.get_block("latest")["timestamp"]
+
+
+def test_settlement_matches_preview(chain):
+    contract, user, agent = chain["contract"], chain["user"], chain["agent"]
+    rng = random.Random(8004)
+    for bps in BPS_VALUES:
+        perm_id = user.grant_permission("differential", "settlement", bps, 10**8)
+        perm, now = user.get_permission(perm_id), head_time(chain["w3"])
+        amounts = [a for a in boundary_amounts(bps) + random_amounts(rng) if engine.can_deposit(perm, agent.address, a, now)]
+        pending = [(amount, agent.deposit_escrow(perm_id, amount, wait=False)) for amount in amounts]
+        for amount, tx in pending:
+            escrow_id = tx.result()
+            preview = contract.functions.previewSettlement(escrow_id).call()
+            expected = engine.preview_settlement(amount, bps)
+            assert engine.settlement_split(amount, bps) == tuple(preview[:3]), (amount, bps)
+            assert (expected["user_share"], expected["protocol_fee"], expected["agent_refund"], expected["dispute_window_end"]) == tuple(preview), (amount, bps)
+
+
+def test_check_access_at_valid_until(chain):
+    w3, user, agent = chain["w3"], chain["user"], chain["agent"]
+    open_id = user.grant_permission("differential", "access", 1000, 1_000)
+    merchant_id = user.grant_permission("differential", "access", 1000, 1_000, merchant=agent.address)
+    for perm_id in (open_id, merchant_id):
+        perm = user.get_permission(perm_id)
+        for now in (perm["valid_until"] - 1, perm["valid_until"], perm["valid_until"] + 1):
+            if now <= head_time(w3):
+                continue
+            block = mine_at(w3, now)
+            for address in (agent.address, chain["other"]):
+                permitted, bps, upfront_fee, valid_until = chain["contract"].functions.checkAccess(perm_id, address).call(block_identifier=block)
+                expected = engine.check_access(perm, address, now)
+                assert expected == {"permitted": permitted, "compensation_bps": bps, "upfront_fee": upfront_fee, "valid_until": valid_until}, (perm_id, address, now - perm["valid_until"])
+
+
+def refund_succeeds(contract, caller, escrow_id, block):
+    try:
+        contract.functions.refundEscrow(escrow_id).call({"from": caller}, block_identifier=block)
+    except (ContractLogicError, Web3RPCError):
+        return False
+    return True
+
+
+def test_can_refund_at_revocation_grace(chain):
+    w3, user, agent = chain["w3"], chain["user"], chain["agent"]
+    perm_id = user.grant_permission("differential", "refund", 1000, 10**8)
+    funded = agent.deposit_escrow(perm_id, 10**6)
+    reported = agent.deposit_escrow(perm_id, 10**6)
+    agent.report_outcome(reported, 1, "differential", "refund")
+    user.revoke_permission(perm_id)
+    perm = user.get_permission(perm_id)
+    grace_end = perm["revoked_at"] + REVOCATION_GRACE
+    for now in (grace_end - 1, grace_end, grace_end + 1):
+        if now <= head_time(w3):
+            continue
+        block = mine_at(w3, now)
+        for escrow_id in (funded, reported):
+            escrow = agent.get_escrow(escrow_id)
+            assert engine.can_refund(escrow, perm, now) == refund_succeeds(chain["contract"], agent.address, escrow_id, block), (escrow_id, now - grace_end)
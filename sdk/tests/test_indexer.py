@@ -0,0 +1,242 @@
+"""
+EventIndexer against a scripted chain of crafted PrmissionV2 logs: row
+materialization, confirmations, adaptive log paging, resuming from the
+checkpoint, and reorg detection with rollback and replay.
+"""
+import os
+import sys
+
+import pytest
+from eth_abi import encode
+from eth_utils import event_abi_to_log_topic
+from web3 import Web3
+from web3.providers import BaseProvider
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from prmission_sdk.constants import DISPUTE_WINDOW, PRMISSION_V2_ABI, EscrowStatus, PermissionStatus
+from prmission_sdk.indexer import EventIndexer
+
+CONTRACT = "0x" + "c0" * 20
+USER = Web3.to_checksum_address("0x" + "01" * 20)
+AGENT = Web3.to_checksum_address("0x" + "02" * 20)
+ZERO = "0x" + "00" * 20
+GENESIS_TIME = 1_700_000_000
+EVENT_ABIS = {item["name"]: item for item in PRMISSION_V2_ABI if item.get("type") == "event"}
+
+
+def block_time(number):
+    return GENESIS_TIME + 12 * number
+
+
+class ScriptedChain(BaseProvider):
+    """
+    web3 provider serving blocks and logs from memory. mine() appends a
+    block holding the given (event, args) logs; reorg(depth) drops the last
+    depth blocks so the next mine() calls build a competing branch.
+    eth_getLogs queries wider than max_range blocks are rejected.
+    """
+
+    def __init__(self, max_range=None):
+        super().__init__()
+        self.max_range = max_range
+        self.blocks = []
+        self.log_queries = []
+        self._branch = 0
+        self.mine()
+
+    def mine(self, *events):
+        number = len(self.blocks)
+        block_hash = Web3.keccak(text=f"{self._branch}:{number}")
+        logs = [self._log(name, args, number, block_hash, index) for index, (name, args) in enumerate(events)]
+        self.blocks.append({"hash": block_hash, "logs": logs})
+        return number
+
+    def reorg(self, depth):
+        del self.blocks[-depth:]
+        self._branch += 1
+
+    @property
+    def head(self):
+        return len(self.blocks) - 1
+
+    def _log(self, name, args, number, block_hash, index):
+        abi = EVENT_ABIS[name]
+        indexed = [i for i in abi["inputs"] if i["indexed"]]
+        plain = [i for i in abi["inputs"] if not i["indexed"]]
+        topics = [event_abi_to_log_topic(abi)] + [encode([i["type"]], [args[i["name"]]]) for i in indexed]
+        return {
+            "address": CONTRACT, "blockHash": Web3.to_hex(block_hash), "blockNumber": hex(number),
+            "data": Web3.to_hex(encode([i["type"] for i in plain], [args[i["name"]] for i in plain])),
+            "logIndex": hex(index), "removed": False, "topics": [Web3.to_hex(t) for t in topics],
+            "transactionHash": Web3.to_hex(Web3.keccak(block_hash + bytes([index]))), "transactionIndex": hex(index),
+        }
+
+    def make_request(self, method, params):
+        if method == "eth_chainId":
+            return {"jsonrpc": "2.0", "id": 0, "result": "0x1"}
+        if method == "eth_blockNumber":
+            return {"jsonrpc": "2.0", "id": 0, "result": hex(self.head)}
+        if method == "eth_getBlockByNumber":
+            number = self.head if params[0] == "latest" else int(params[0], 16)
+            if number > self.head:
+                return {"jsonrpc": "2.0", "id": 0, "result": None}
+            block = self.blocks[number]
+            parent = self.blocks[number - 1]["hash"] if number else b"\0" * 32
+            result = {"number": hex(number), "hash": Web3.to_hex(block["hash"]), "parentHash": Web3.to_hex(parent), "timestamp": hex(block_time(number)), "transactions": []}
+            return {"jsonrpc": "2.0", "id": 0, "result": result}
+        if method == "eth_getLogs":
+            start, end = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+            self.log_queries.append((start, end))
+            if self.max_range is not None and end - start + 1 > self.max_range:
+                return {"jsonrpc": "2.0", "id": 0, "error": {"code": -32005, "message": "query returned more than 10000 results"}}
+            logs = [log for block in self.blocks[start:end + 1] for log in block["logs"]]
+            return {"jsonrpc": "2.0", "id": 0, "result": logs}
+        raise NotImplementedError(method)
+
+
+def granted(permission_id, bps=1000):
+    return "PermissionGranted", {"permissionId": permission_id, "user": USER, "merchant": ZERO, "dataCategory": "location", "purpose": "ads", "compensationBps": bps, "upfrontFee": 0, "validUntil": 2**64}
+
+
+def deposited(escrow_id, permission_id, amount=10**6):
+    return "EscrowDeposited", {"escrowId": escrow_id, "permissionId": permission_id, "agent": AGENT, "agentId": 0, "amount": amount}
+
+
+def reported(escrow_id, number):
+    return "OutcomeReported", {"escrowId": escrow_id, "outcomeValue": 1, "outcomeType": "conversion", "disputeWindowEnd": block_time(number) + DISPUTE_WINDOW}
+
+
+def revoked(permission_id, number):
+    return "PermissionRevoked", {"permissionId": permission_id, "user": USER, "revokedAt": block_time(number), "graceEndsAt": block_time(number) + 60}
+
+
+@pytest.fixture
+def chain():
+    return ScriptedChain()
+
+
+def indexer_for(chain, path, **kwargs):
+    return EventIndexer(Web3(chain), str(path), CONTRACT, **{"confirmations": 0, **kwargs})
+
+
+def mine_lifecycle(chain):
+    """Permission 1 with escrow 1 reported and the permission revoked afterwards."""
+    chain.mine(granted(1))
+    chain.mine(deposited(1, 1))
+    chain.mine()
+    chain.mine(reported(1, 4))
+    chain.mine(revoked(1, 5))
+
+
+def test_materializes_rows(chain, tmp_path):
+    mine_lifecycle(chain)
+    indexer = indexer_for(chain, tmp_path / "index.sqlite")
+    seen = []
+    indexer.listeners.append(lambda name, args: seen.append(name))
+    assert indexer.sync() == 4
+    assert seen == ["PermissionGranted", "EscrowDeposited", "OutcomeReported", "PermissionRevoked"]
+    perm, escrow = indexer.get_permission(1), indexer.get_escrow(1)
+    assert (perm["status"], perm["revoked_at"], perm["created_at"]) == (PermissionStatus.REVOKED, block_time(5), block_time(1))
+    assert perm["valid_until"] == str(2**64)
+    assert (escrow["status"], escrow["reported_at"], escrow["created_at"]) == (EscrowStatus.OUTCOME_REPORTED, block_time(4), block_time(2))
+    assert indexer.settleable_escrows(now=block_time(4) + DISPUTE_WINDOW) == [escrow]
+
+
+def test_waits_for_confirmations(chain, tmp_path):
+    mine_lifecycle(chain)
+    indexer = indexer_for(chain, tmp_path / "index.sqlite", confirmations=2)
+    indexer.sync()
+    assert indexer.last_block == chain.head - 2
+    assert indexer.get_escrow(1)["status"] == EscrowStatus.FUNDED
+
+
+def test_adaptive_paging(tmp_path):
+    chain = ScriptedChain(max_range=4)
+    for i in range(1, 31):
+        events = [granted(i)] if i % 3 == 0 else []
+        chain.mine(*events)
+    indexer = indexer_for(chain, tmp_path / "index.sqlite", initial_range=64, max_range=64)
+    assert indexer.sync() == 10
+    assert chain.log_queries[0] == (0, 30)
+    served = [(start, end) for start, end in chain.log_queries if end - start + 1 <= 4]
+    # Rejected ranges are halved until they pass, and the pages that pass tile the chain
+    assert [start for start, _ in served] == [0] + [end + 1 for _, end in served[:-1]] and served[-1][1] == 30
+    assert len(indexer.permissions()) == 10
+
+
+def test_paging_gives_up_below_min_range(tmp_path):
+    chain = ScriptedChain(max_range=4)
+    for _ in range(20):
+        chain.mine()
+    indexer = indexer_for(chain, tmp_path / "index.sqlite", initial_range=64, min_range=8)
+    with pytest.raises(Exception, match="more than 10000 results"):
+        indexer.sync()
+    assert indexer.last_block == -1
+
+
+def test_resumes_from_checkpoint(chain, tmp_path):
+    path = tmp_path / "index.sqlite"
+    chain.mine(granted(1))
+    chain.mine(deposited(1, 1))
+    first = indexer_for(chain, path)
+    first.sync()
+    checkpoint = first.last_block
+    first.close()
+
+    chain.mine(reported(1, 3))
+    chain.log_queries.clear()
+    resumed = indexer_for(chain, path)
+    seen = []
+    resumed.listeners.append(lambda name, args: seen.append(name))
+    assert resumed.last_block == checkpoint
+    assert resumed.sync() == 1
+    assert chain.log_queries[0][0] == checkpoint + 1 and seen == ["OutcomeReported"]
+    assert resumed.get_escrow(1)["status"] == EscrowStatus.OUTCOME_REPORTED
+    assert len(resumed.permissions()) == 1
+
+
+def test_reorg_rolls_back_and_replays(chain, tmp_path):
+    mine_lifecycle(chain)
+    indexer = indexer_for(chain, tmp_path / "index.sqlite")
+    indexer.sync()
+    # Blocks 4 and 5 (the report and the revocation) are replaced by a branch
+    # where a second escrow is deposited and reported instead
+    chain.reorg(2)
+    chain.mine(deposited(2, 1))
+    chain.mine()
+    chain.mine(reported(2, 6))
+    seen = []
+    indexer.listeners.append(lambda name, args: seen.append(name))
+    assert indexer.sync() == 2
+    assert seen == ["EscrowDeposited", "OutcomeReported"]
+    perm, first, second = indexer.get_permission(1), indexer.get_escrow(1), indexer.get_escrow(2)
+    assert (perm["status"], perm["revoked_at"]) == (PermissionStatus.ACTIVE, 0)
+    assert (first["status"], first["reported_at"], first["created_at"]) == (EscrowStatus.FUNDED, 0, block_time(2))
+    assert (second["status"], second["reported_at"]) == (EscrowStatus.OUTCOME_REPORTED, block_time(6))
+    assert [row["event"] for row in indexer._rows("SELECT event FROM events ORDER BY block_number, log_index")] == ["PermissionGranted", "EscrowDeposited", "EscrowDeposited", "OutcomeReported"]
+
+
+def test_reorg_to_a_shorter_chain(chain, tmp_path):
+    mine_lifecycle(chain)
+    indexer = indexer_for(chain, tmp_path / "index.sqlite")
+    indexer.sync()
+    chain.reorg(3)
+    chain.mine()
+    assert indexer.sync() == 0
+    assert indexer.last_block == chain.head
+    assert indexer.get_escrow(1)["status"] == EscrowStatus.FUNDED
+    assert indexer.get_permission(1)["status"] == PermissionStatus.ACTIVE
+
+
+def test_rollback_rebuilds_touched_rows(chain, tmp_path):
+    mine_lifecycle(chain)
+    indexer = indexer_for(chain, tmp_path / "index.sqlite")
+    indexer.sync()
+    indexer.rollback(3)
+    assert indexer.last_block == 3
+    assert indexer.get_escrow(1)["status"] == EscrowStatus.FUNDED
+    assert indexer.get_permission(1)["status"] == PermissionStatus.ACTIVE
+    # Replaying the same blocks restores what was rolled back, without duplicates
+    assert indexer.sync() == 2
+    assert indexer.get_permission(1)["status"] == PermissionStatus.REVOKED
+    assert len(indexer._rows("SELECT * FROM events")) == 4
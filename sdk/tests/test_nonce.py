@@ -0,0 +1,172 @@
+"""
+Nonce handling: NonceManager bookkeeping, and submit_tx against an
+in-process eth-tester chain (pipelined sends, nonce too low, replaced
+transactions, rejected and unconfirmed sends).
+
+No contract is needed: the USDC address is a plain account, so approve()
+is an ordinary transaction with calldata.
+"""
+import os
+import sys
+
+import pytest
+import requests
+from eth_account import Account
+from web3 import EthereumTesterProvider, Web3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from prmission_sdk import PrmissionSDK
+from prmission_sdk.client import PendingTx
+from prmission_sdk.nonce import NonceManager, is_nonce_error, is_nonce_gap
+
+
+# ─── NonceManager ───────────────────────────────────────────────────────
+
+
+def test_next_syncs_once():
+    nonces = NonceManager()
+    assert nonces.next(lambda: 7) == 7
+    assert nonces.next(lambda: 0) == 8
+
+
+def test_release_reuses_lowest_first():
+    nonces = NonceManager()
+    taken = [nonces.next(lambda: 0) for _ in range(5)]
+    nonces.release(3)
+    nonces.release(1)
+    assert [nonces.next() for _ in range(3)] == [1, 3, 5]
+    assert taken == [0, 1, 2, 3, 4]
+
+
+def test_release_at_the_end_shrinks_the_range():
+    nonces = NonceManager()
+    for _ in range(4):
+        nonces.next(lambda: 0)
+    nonces.release(2)
+    nonces.release(3)
+    assert nonces._released == []
+    assert nonces.next() == 2
+
+
+def test_resync_never_moves_back():
+    nonces = NonceManager()
+    for _ in range(3):
+        nonces.next(lambda: 10)
+    nonces.resync(11)
+    assert nonces.next() == 13
+    nonces.release(11)
+    nonces.resync(15)
+    assert nonces._released == []
+    assert nonces.next() == 15
+
+
+def test_classifies_mismatch_messages():
+    low = ValueError("Invalid transaction nonce: Expected 11, but got 10")
+    high = ValueError("Invalid transaction nonce: Expected 10, but got 11")
+    assert is_nonce_error(low) and not is_nonce_gap(low)
+    assert is_nonce_gap(high) and not is_nonce_error(high)
+    assert is_nonce_error(ValueError("nonce too low")) and is_nonce_gap(ValueError("nonce too high"))
+
+
+# ─── submit_tx on eth-tester ────────────────────────────────────────────
+
+
+@pytest.fixture
+def chain():
+    provider = EthereumTesterProvider()
+    w3 = Web3(provider)
+    account = Account.create()
+    w3.eth.send_transaction({"from": w3.eth.accounts[0], "to": account.address, "value": 10**21})
+    sdk = PrmissionSDK(account.key, rpc_url=provider, usdc_address=w3.eth.accounts[1], chain_id=w3.eth.chain_id, multicall_address=None, nonce_retries=1)
+    return w3, account, sdk
+
+
+def chain_nonce(w3, account):
+    return w3.eth.get_transaction_count(account.address)
+
+
+def send_outside(w3, account, nonce):
+    """A transaction from the same key that the SDK doesn't know about."""
+    tx = {"to": w3.eth.accounts[0], "value": 1, "gas": 21_000, "gasPrice": w3.eth.gas_price, "nonce": nonce, "chainId": w3.eth.chain_id}
+    return w3.eth.send_raw_transaction(account.sign_transaction(tx).raw_transaction)
+
+
+def test_pipelined_sends(chain):
+    w3, account, sdk = chain
+    pending = [sdk.approve_usdc(amount, wait=False) for amount in range(1, 6)]
+    assert [p.nonce for p in pending] == [0, 1, 2, 3, 4]
+    assert all(r["receipt"]["status"] == 1 for r in sdk.wait_all(pending))
+    assert chain_nonce(w3, account) == 5
+
+
+def test_nonce_too_low_resyncs(chain):
+    w3, account, sdk = chain
+    sdk.approve_usdc(1)
+    send_outside(w3, account, 1)
+    result = sdk.approve_usdc(2)
+    assert result["receipt"]["status"] == 1
+    assert w3.eth.get_transaction(result["tx_hash"])["nonce"] == 2
+
+
+def test_nonce_too_low_out_of_retries(chain):
+    w3, account, sdk = chain
+    sdk.approve_usdc(1)
+    for nonce in (1, 2):
+        send_outside(w3, account, nonce)
+    sdk.nonce_retries = 0
+    with pytest.raises(Exception, match="Expected 3, but got 1"):
+        sdk.approve_usdc(2)
+    # Resynced even though it gave up, so the next send goes through
+    assert sdk.approve_usdc(3)["receipt"]["status"] == 1
+
+
+def test_gap_releases_the_nonce(chain):
+    w3, account, sdk = chain
+    sdk.approve_usdc(1)
+    # Nonce 1 handed out for a transaction that never reached the node
+    lost = sdk.nonces.next()
+    with pytest.raises(Exception, match="Expected 1, but got 2"):
+        sdk.approve_usdc(2)
+    assert sdk.nonces.next() == 2
+    sdk.nonces.release(2)
+    sdk.nonces.release(lost)
+    assert sdk.approve_usdc(3)["receipt"]["status"] == 1
+
+
+def test_replaced_transaction(chain):
+    w3, account, sdk = chain
+    sdk.approve_usdc(1)
+    send_outside(w3, account, 1)
+    pending = PendingTx(sdk, b"\x01" * 32, 1, "replaced")
+    with pytest.raises(Exception, match="Transaction replaced"):
+        pending.result(timeout=0.2)
+    assert sdk.nonces.next() == 2
+
+
+def test_transport_error_before_the_node_releases(chain, monkeypatch):
+    w3, account, sdk = chain
+    sdk.approve_usdc(1)
+
+    def timeout(raw):
+        raise requests.exceptions.ReadTimeout("read timed out")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(sdk.w3.eth, "send_raw_transaction", timeout)
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            sdk.approve_usdc(2)
+    result = sdk.approve_usdc(3)
+    assert w3.eth.get_transaction(result["tx_hash"])["nonce"] == 1
+
+
+def test_transport_error_after_the_node_accepts(chain, monkeypatch):
+    w3, account, sdk = chain
+    send = sdk.w3.eth.send_raw_transaction
+
+    def lost_reply(raw):
+        send(raw)
+        raise requests.exceptions.ReadTimeout("read timed out")
+
+    monkeypatch.setattr(sdk.w3.eth, "send_raw_transaction", lost_reply)
+    result = sdk.approve_usdc(1)
+    assert result["receipt"]["status"] == 1
+    assert sdk.nonces.next() == 1
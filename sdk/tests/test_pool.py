@@ -0,0 +1,199 @@
+"""
+RPCPool against scripted local JSON-RPC endpoints: failover, endpoint-health
+errors, ejection and probation, hedging and its bound on losing requests,
+scoring of hung endpoints, and transaction broadcast.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from web3 import Web3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from prmission_sdk import MetricsRegistry, RPCPool
+
+RAW_TX = "0x" + "ab" * 40
+
+
+class ScriptedNode:
+    """Local JSON-RPC endpoint answering every request with `result` after `delay`, or with an HTTP `status` or JSON-RPC `error`."""
+
+    def __init__(self, delay=0.0, status=200, error=None, result="0x1"):
+        self.delay = delay
+        self.status = status
+        self.error = error
+        self.result = result
+        self.methods = []
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                node.methods.append(body["method"])
+                time.sleep(node.delay)
+                if node.status != 200:
+                    self.send_error(node.status)
+                    return
+                reply = {"error": node.error} if node.error is not None else {"result": node.result}
+                payload = json.dumps({"jsonrpc": "2.0", "id": body["id"], **reply}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def requests(self):
+        return len(self.methods)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def nodes():
+    started = []
+
+    def start(**kwargs):
+        node = ScriptedNode(**kwargs)
+        started.append(node)
+        return node
+
+    yield start
+    for node in started:
+        node.close()
+
+
+@pytest.fixture
+def pool():
+    pools = []
+
+    def make(nodes, **kwargs):
+        pool = RPCPool([node.url for node in nodes], **{"metrics": MetricsRegistry(), "hedge_after": None, **kwargs})
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def test_fails_over_on_transport_errors(nodes, pool):
+    down, up = nodes(status=503), nodes()
+    rpc = pool([down, up])
+    assert Web3(rpc).eth.block_number == 1
+    assert (down.requests, up.requests) == (1, 1)
+    assert [s["failures"] for s in rpc.stats()] == [1, 0]
+
+
+def test_fails_over_on_endpoint_health_errors(nodes, pool):
+    limited, up = nodes(error={"code": -32005, "message": "rate limit exceeded"}), nodes()
+    assert pool([limited, up]).make_request("eth_blockNumber", [])["result"] == "0x1"
+    assert up.requests == 1
+
+
+def test_returns_reverts_without_failover(nodes, pool):
+    reverted = {"code": 3, "message": "execution reverted", "data": "0x08c379a0"}
+    first, second = nodes(error=reverted), nodes()
+    assert pool([first, second]).make_request("eth_call", [{}, "latest"])["error"] == reverted
+    assert second.requests == 0
+
+
+def test_all_endpoints_failing_raises(nodes, pool):
+    with pytest.raises(Exception):
+        pool([nodes(status=503), nodes(status=503)]).make_request("eth_blockNumber", [])
+
+
+def test_ejects_and_puts_on_probation(nodes, pool):
+    clock = Clock()
+    first, second = nodes(status=503), nodes(status=503)
+    rpc = pool([first, second], max_failures=2, backoff=10, clock=clock)
+    for _ in range(2):
+        with pytest.raises(Exception):
+            rpc.make_request("eth_blockNumber", [])
+    assert [s["ejected_for"] for s in rpc.stats()] == [10, 10]
+    # With every endpoint ejected the pool still tries them, and a success brings one back
+    second.status = 200
+    assert rpc.make_request("eth_blockNumber", [])["result"] == "0x1"
+    # Back from ejection, a single failure ejects again, for twice as long
+    assert [s["ejected_for"] for s in rpc.stats()] == [20, 0]
+    clock.now = 20
+    rpc.make_request("eth_blockNumber", [])
+    assert [s["ejected_for"] for s in rpc.stats()] == [40, 0]
+    assert (first.requests, second.requests) == (4, 4)
+
+
+def test_hedges_slow_calls(nodes, pool):
+    slow, fast = nodes(delay=1.0), nodes()
+    rpc = pool([slow, fast], hedge_after=0.05, hedge_budget=1.0)
+    start = time.perf_counter()
+    assert rpc.make_request("eth_call", [{}, "latest"])["result"] == "0x1"
+    assert time.perf_counter() - start < 0.5
+    assert rpc.metrics.counter("rpc_hedges_total", method="eth_call") == 1
+    assert rpc.metrics.counter("rpc_hedge_wins_total", method="eth_call") == 1
+
+
+def test_losing_hedges_are_bounded(nodes, pool):
+    first, second = nodes(delay=0.3), nodes(delay=1.0)
+    rpc = pool([first, second], hedge_after=0.05, hedge_budget=1.0, max_workers=4)
+    rpc.make_request("eth_call", [{}, "latest"])
+    assert rpc._losers == 1 == rpc._max_losers
+    # The loser still holds a worker: this call waits instead of hedging again
+    rpc.make_request("eth_call", [{}, "latest"])
+    assert rpc.metrics.counter("rpc_hedges_total", method="eth_call") == 1
+    time.sleep(0.8)
+    assert rpc._losers == 0
+
+
+def test_hung_endpoint_sinks(nodes, pool):
+    hung, up = nodes(delay=1.0), nodes()
+    rpc = pool([hung, up])
+    waiting = threading.Thread(target=rpc.make_request, args=("eth_blockNumber", []))
+    waiting.start()
+    time.sleep(0.1)
+    # Neither is measured yet, but the hung one has a request 0.1s old
+    assert rpc.ranked()[0].url == up.url
+    rpc.make_request("eth_blockNumber", [])
+    assert (hung.requests, up.requests) == (1, 1)
+    waiting.join()
+
+
+def test_broadcasts_to_every_endpoint(nodes, pool):
+    tx_hash = Web3.to_hex(Web3.keccak(hexstr=RAW_TX))
+    known, down, accepting = nodes(error={"code": -32000, "message": "already known"}), nodes(status=503), nodes(delay=0.05, result=tx_hash)
+    assert pool([known, down, accepting]).make_request("eth_sendRawTransaction", [RAW_TX])["result"] == tx_hash
+    time.sleep(0.1)
+    assert (known.requests, down.requests, accepting.requests) == (1, 1, 1)
+
+
+def test_broadcast_already_known_counts_as_accepted(nodes, pool):
+    known = nodes(error={"code": -32000, "message": "already known"})
+    response = pool([known, nodes(status=503)]).make_request("eth_sendRawTransaction", [RAW_TX])
+    assert response["result"] == Web3.to_hex(Web3.keccak(hexstr=RAW_TX))
+
+
+def test_broadcast_rejected_everywhere(nodes, pool):
+    rejected = {"code": -32000, "message": "insufficient funds for gas * price + value"}
+    response = pool([nodes(error=rejected), nodes(error=rejected)]).make_request("eth_sendRawTransaction", [RAW_TX])
+    assert response["error"] == rejected
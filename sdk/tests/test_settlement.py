@@ -0,0 +1,135 @@
+"""
+SettlementSweeper: bookkeeping when reads, sends or receipts fail (against
+a stub SDK), and settling and refunding on a local chain with time travel
+(the `chain` fixture in conftest.py).
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+from web3.exceptions import TransactionNotFound
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from prmission_sdk.constants import DISPUTE_WINDOW, REVOCATION_GRACE, EscrowStatus
+from prmission_sdk.settlement import SETTLE, SettlementSweeper
+
+
+class StubPending:
+    def __init__(self, tx_hash, error):
+        self.tx_hash = tx_hash
+        self.error = error
+
+    def receipt(self):
+        if self.error is not None:
+            raise self.error
+        return {"status": 1, "gasUsed": 21_000, "effectiveGasPrice": 1}
+
+
+class StubSDK:
+    """Settles every escrow; escrow ids in `fail` revert, and reads raise `read_error` when set."""
+
+    address = "0x" + "11" * 20
+
+    def __init__(self, fail=(), read_error=None, receipt_error=None):
+        self.fail = set(fail)
+        self.read_error = read_error
+        self.sent = []
+        self.w3 = SimpleNamespace(eth=SimpleNamespace(get_transaction_receipt=self._receipt))
+        self.receipt_error = receipt_error
+
+    def settle(self, escrow_id, wait=True):
+        self.sent.append(escrow_id)
+        return StubPending(bytes([escrow_id]) * 32, Exception("reverted") if escrow_id in self.fail else None)
+
+    def get_escrow(self, escrow_id):
+        if self.read_error is not None:
+            raise self.read_error
+        return {"status": EscrowStatus.OUTCOME_REPORTED}
+
+    def _receipt(self, tx_hash):
+        if self.receipt_error is not None:
+            raise self.receipt_error
+        raise TransactionNotFound("not mined")
+
+
+def queued(sweeper, *escrow_ids):
+    for escrow_id in escrow_ids:
+        sweeper._push(0, escrow_id, SETTLE)
+
+
+def consistent(sweeper):
+    return sweeper._queued == {escrow_id for _, escrow_id, _ in sweeper._queue}
+
+
+def test_failed_reads_and_receipts_requeue():
+    sdk = StubSDK(fail={2}, read_error=ConnectionError("read timed out"), receipt_error=ConnectionError("read timed out"))
+    sweeper = SettlementSweeper(sdk, max_in_flight=2, max_retries=2, retry_delay=10, clock=lambda: 0)
+    queued(sweeper, 1, 2, 3, 4)
+    assert sweeper.sweep(0) == 3
+    assert sweeper.metrics(0)["backlog"] == 1 and consistent(sweeper)
+    assert sweeper.sweep(5) == 0 and sdk.sent == [1, 2, 3, 4]
+    for now in (10, 30):
+        sweeper.sweep(now)
+        assert consistent(sweeper)
+    assert sweeper.stats["failed"] == 1 and sweeper.stats["retries"] == 2
+    assert sweeper._queued == set() and 2 in sweeper._given_up
+
+
+def test_failed_send_is_dropped_once_closed():
+    sdk = StubSDK(fail={1})
+    sweeper = SettlementSweeper(sdk, clock=lambda: 0)
+    queued(sweeper, 1)
+    sdk.get_escrow = lambda escrow_id: {"status": EscrowStatus.SETTLED}
+    sweeper.sweep(0)
+    assert sweeper.stats["dropped"] == 1 and sweeper.metrics(0)["backlog"] == 0 and consistent(sweeper)
+
+
+def test_collects_everything_in_flight():
+    sdk = StubSDK(fail={1, 3}, read_error=ConnectionError("read timed out"))
+    sweeper = SettlementSweeper(sdk, max_in_flight=8, clock=lambda: 0)
+    queued(sweeper, 1, 2, 3, 4, 5)
+    assert sweeper.sweep(0) == 3
+    assert sweeper._queued == {1, 3} and consistent(sweeper)
+
+
+def advance(w3, seconds):
+    w3.provider.make_request("evm_increaseTime", [seconds])
+    w3.provider.make_request("evm_mine", [])
+
+
+def test_settles_and_refunds_on_chain(chain):
+    w3, user, agent = chain["w3"], chain["user"], chain["agent"]
+    perm_id = user.grant_permission("sweeper", "settle", 1000, 10**8)
+    settled = [agent.deposit_escrow(perm_id, 10**6) for _ in range(3)]
+    for escrow_id in settled:
+        agent.report_outcome(escrow_id, 1, "sweeper", "settle")
+    revoked_id = user.grant_permission("sweeper", "refund", 1000, 10**8)
+    refunded = agent.deposit_escrow(revoked_id, 10**6)
+    user.revoke_permission(revoked_id)
+
+    sweeper = SettlementSweeper(agent, max_in_flight=2)
+    sweeper.refresh()
+    assert sweeper.sweep() == 0
+    assert sweeper.metrics()["backlog"] == 4
+
+    advance(w3, REVOCATION_GRACE + 1)
+    assert sweeper.sweep() == 1
+    assert agent.get_escrow(refunded)["status"] == EscrowStatus.REFUNDED
+
+    advance(w3, DISPUTE_WINDOW)
+    assert sweeper.sweep() == 3
+    assert all(agent.get_escrow(escrow_id)["status"] == EscrowStatus.SETTLED for escrow_id in settled)
+    assert sweeper.metrics()["backlog"] == 0 and consistent(sweeper)
+
+
+def test_drops_escrows_closed_by_someone_else(chain):
+    w3, user, agent = chain["w3"], chain["user"], chain["agent"]
+    perm_id = user.grant_permission("sweeper", "dropped", 1000, 10**8)
+    escrow_id = agent.deposit_escrow(perm_id, 10**6)
+    agent.report_outcome(escrow_id, 1, "sweeper", "dropped")
+    sweeper = SettlementSweeper(agent)
+    sweeper.refresh()
+    advance(w3, DISPUTE_WINDOW + 1)
+    user.settle(escrow_id)
+    assert sweeper.sweep() == 0
+    assert sweeper.stats["dropped"] == 1 and sweeper.metrics()["backlog"] == 0